@@ -1,12 +1,78 @@
 """
 Database operations module for the Dai Maou Liar Game.
 Handles SQLite database initialization, room CRUD operations, and cleanup.
+Live rooms are kept in memory; SQLite holds a snapshot taken at phase boundaries.
 """
 
+import logging
 import sqlite3
-import json
+import orjson
 import os
 import atexit
+import queue
+from contextlib import contextmanager
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+
+# Every persisted room field: (room key, column, default, stored as JSON).
+# JSON defaults are factories so each room gets its own list/dict.
+ROOM_FIELDS = (
+    ('players', 'players', list, True),
+    ('host_id', 'host_id', '', False),
+    ('phase', 'phase', 'waiting', False),
+    ('language', 'language', 'en', False),
+    ('imposter_id', 'imposter_id', None, False),
+    ('impostor_ids', 'impostor_ids', list, True),
+    ('roles', 'roles', dict, True),
+    ('questions', 'questions', dict, True),
+    ('answers', 'answers', dict, True),
+    ('votes', 'votes', dict, True),
+    ('results', 'results', dict, True),
+    ('lobby_events', 'lobby_events', list, True),
+    ('main_question', 'main_question', None, False),
+    ('ready_to_vote', 'ready_to_vote', list, True),
+    ('settings', 'settings', dict, True),
+    ('questionPhaseStartTimestamp', 'question_phase_start_timestamp', None, False),
+    ('questionPhaseEndTimestamp', 'question_phase_end_timestamp', None, False),
+    ('votingPhaseStartTimestamp', 'voting_phase_start_timestamp', None, False),
+    ('votingPhaseEndTimestamp', 'voting_phase_end_timestamp', None, False),
+    ('voteSelectionStartTimestamp', 'vote_selection_start_timestamp', None, False),
+    ('voteSelectionEndTimestamp', 'vote_selection_end_timestamp', None, False),
+    ('liarVotes', 'liar_votes', dict, True),
+    ('used_question_indexes', 'used_question_indexes', list, True),
+    ('current_round', 'current_round', 1, False),
+    ('total_rounds', 'total_rounds', 5, False),
+    ('player_scores', 'player_scores', dict, True),
+    ('round_history', 'round_history', list, True),
+)
+
+
+ROOM_COLUMNS = tuple(column for _, column, _, _ in ROOM_FIELDS)
+
+# SQL is built once so every call reuses the same text (and sqlite3's statement cache)
+_INSERT_ROOM_SQL = (
+    f"INSERT INTO rooms (room_id, {', '.join(ROOM_COLUMNS)}) "
+    f"VALUES ({', '.join('?' * (len(ROOM_COLUMNS) + 1))})"
+)
+_SELECT_ALL_ROOMS_SQL = 'SELECT * FROM rooms'
+_DELETE_ROOM_SQL = 'DELETE FROM rooms WHERE room_id = ?'
+
+
+@lru_cache(maxsize=None)
+def _update_room_sql(columns):
+    """UPDATE statement for a tuple of changed columns, memoized per column set."""
+    assignments = ', '.join(f"{column} = ?" for column in columns)
+    return f"UPDATE rooms SET {assignments} WHERE room_id = ?"
+
+
+def _serialize_field(room_data, key, default, is_json):
+    """Convert one room field to the value stored in its column."""
+    if is_json:
+        # orjson returns bytes; the columns are TEXT
+        return orjson.dumps(room_data.get(key, default())).decode()
+    return room_data.get(key, default)
 
 
 class DatabaseManager:
@@ -14,13 +80,28 @@ class DatabaseManager:
     
     def __init__(self, db_path='game_rooms.db'):
         self.DB_PATH = db_path
+        # Idle connections, reused across calls instead of reconnecting each time
+        self._pool = queue.LifoQueue()
+        # Last value written to each column, per room, so unchanged columns are skipped
+        self._written = {}
+        # Authoritative live rooms; get_room hands out these dicts directly
+        self._rooms = {}
+        # Room keys changed since each room's last snapshot; None means "unknown, check all"
+        self._dirty = {}
+        # Bumped on every write so readers can tell whether a room changed
+        self._versions = {}
         self.init_database()
+        self._load_rooms()
         # Register cleanup function to run on shutdown
         atexit.register(self.cleanup_database)
     
     def init_database(self):
         """Initialize the SQLite database with required tables."""
-        conn = sqlite3.connect(self.DB_PATH)
+        with self.get_connection() as conn:
+            self._create_tables(conn)
+    
+    def _create_tables(self, conn):
+        """Create the rooms table if it doesn't exist yet."""
         cursor = conn.cursor()
         
         # Create rooms table
@@ -58,191 +139,185 @@ class DatabaseManager:
         ''')
         
         conn.commit()
-        conn.close()
+    
+    def _load_rooms(self):
+        """Hydrate the in-memory rooms from any snapshot left in the database."""
+        with self.get_connection() as conn:
+            rows = conn.execute(_SELECT_ALL_ROOMS_SQL).fetchall()
+        
+        for row in rows:
+            self._rooms[row['room_id']] = self._row_to_room(row)
+    
+    def _row_to_room(self, row):
+        """Convert a rooms table row back into a room dictionary."""
+        room_data = {}
+        for key, column, default, is_json in ROOM_FIELDS:
+            value = row[column]
+            if is_json:
+                value = orjson.loads(value) if value else default()
+            room_data[key] = value
+        
+        return room_data
     
     def cleanup_database(self):
-        """Remove the database file on shutdown for fresh slate."""
+        """Close pooled connections and remove the database file on shutdown for fresh slate."""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+        
         if os.path.exists(self.DB_PATH):
             os.remove(self.DB_PATH)
-            print("Database cleaned up for fresh slate.")
+            logger.info("Database cleaned up for fresh slate.")
+        # WAL mode keeps two sidecar files next to the database
+        for suffix in ('-wal', '-shm'):
+            if os.path.exists(self.DB_PATH + suffix):
+                os.remove(self.DB_PATH + suffix)
     
-    def get_connection(self):
-        """Get a database connection."""
-        conn = sqlite3.connect(self.DB_PATH)
+    def _connect(self):
+        """Open a new database connection configured for concurrent access."""
+        conn = sqlite3.connect(self.DB_PATH, check_same_thread=False, cached_statements=256)
         conn.row_factory = sqlite3.Row  # This enables column access by name
+        # WAL lets readers run alongside a writer; NORMAL sync is safe with WAL
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA temp_store=MEMORY')
         return conn
     
+    @contextmanager
+    def get_connection(self):
+        """Borrow a pooled database connection for the duration of a with block."""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._pool.put(conn)
+    
     def create_room(self, room_id, room_data):
-        """Create a new room in the database."""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        """
+        Create a new room in memory and write its first snapshot.
+        Missing fields are filled with their defaults, so every live room carries
+        the full ROOM_FIELDS set and callers can index it directly.
+        """
+        for key, _, default, is_json in ROOM_FIELDS:
+            if key not in room_data:
+                room_data[key] = default() if is_json else default
         
-        cursor.execute('''
-            INSERT INTO rooms (
-                room_id, players, host_id, phase, language, imposter_id, impostor_ids, roles, questions,
-                answers, votes, results, lobby_events, main_question, ready_to_vote,
-                settings, question_phase_start_timestamp, question_phase_end_timestamp,
-                voting_phase_start_timestamp, voting_phase_end_timestamp,
-                vote_selection_start_timestamp, vote_selection_end_timestamp,
-                liar_votes, used_question_indexes,
-                current_round, total_rounds, player_scores, round_history
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            room_id,
-            json.dumps(room_data.get('players', [])),
-            room_data.get('host_id', ''),
-            room_data.get('phase', 'waiting'),
-            room_data.get('language', 'en'),
-            room_data.get('imposter_id'),
-            json.dumps(room_data.get('impostor_ids', [])),
-            json.dumps(room_data.get('roles', {})),
-            json.dumps(room_data.get('questions', {})),
-            json.dumps(room_data.get('answers', {})),
-            json.dumps(room_data.get('votes', {})),
-            json.dumps(room_data.get('results', {})),
-            json.dumps(room_data.get('lobby_events', [])),
-            room_data.get('main_question'),
-            json.dumps(room_data.get('ready_to_vote', [])),
-            json.dumps(room_data.get('settings', {})),
-            room_data.get('questionPhaseStartTimestamp'),
-            room_data.get('questionPhaseEndTimestamp'), 
-            room_data.get('votingPhaseStartTimestamp'),
-            room_data.get('votingPhaseEndTimestamp'),
-            room_data.get('voteSelectionStartTimestamp'),
-            room_data.get('voteSelectionEndTimestamp'),  
-            json.dumps(room_data.get('liarVotes', {})),
-            json.dumps(room_data.get('used_question_indexes', [])),
-            room_data.get('current_round', 1),
-            room_data.get('total_rounds', 5),
-            json.dumps(room_data.get('player_scores', {})),
-            json.dumps(room_data.get('round_history', []))
-        ))
+        values = [_serialize_field(room_data, key, default, is_json)
+                  for key, _, default, is_json in ROOM_FIELDS]
         
-        conn.commit()
-        conn.close()
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(_INSERT_ROOM_SQL, (room_id, *values))
+            
+            conn.commit()
+        
+        self._rooms[room_id] = room_data
+        self._written[room_id] = dict(zip(ROOM_COLUMNS, values))
+        self._dirty[room_id] = set()
     
     def get_room(self, room_id):
-        """Get a room from the database."""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        """
+        Get the live room dictionary, or None if the room doesn't exist.
+        Callers must hold the room's lock while mutating it.
+        """
+        return self._rooms.get(room_id)
+    
+    def update_room(self, room_id, room_data, dirty=None):
+        """
+        Store the room in memory.
+        The SQLite snapshot is only refreshed when the phase changed since the
+        last write, so per-answer and per-vote updates never touch the disk.
+        Pass 'dirty' (the room keys that were changed) so the snapshot only
+        serializes those; without it every field is compared.
+        """
+        self._rooms[room_id] = room_data
+        self._versions[room_id] = self._versions.get(room_id, 0) + 1
         
-        cursor.execute('SELECT * FROM rooms WHERE room_id = ?', (room_id,))
-        row = cursor.fetchone()
-        conn.close()
-        
-        if not row:
-            return None
-        
-        room_data = {
-            'players': json.loads(row['players']),
-            'host_id': row['host_id'],
-            'phase': row['phase'],
-            'language': row['language'],
-            'imposter_id': row['imposter_id'],
-            'impostor_ids': json.loads(row['impostor_ids']) if row['impostor_ids'] else [],  # ✅ ADD
-            'roles': json.loads(row['roles']),
-            'questions': json.loads(row['questions']),
-            'answers': json.loads(row['answers']),
-            'votes': json.loads(row['votes']),
-            'results': json.loads(row['results']),
-            'lobby_events': json.loads(row['lobby_events']),
-            'main_question': row['main_question'],
-            'ready_to_vote': json.loads(row['ready_to_vote']),
-            'settings': json.loads(row['settings']),
-            'questionPhaseStartTimestamp': row['question_phase_start_timestamp'],
-            'questionPhaseEndTimestamp': row['question_phase_end_timestamp'],
-            'votingPhaseStartTimestamp': row['voting_phase_start_timestamp'],
-            'votingPhaseEndTimestamp': row['voting_phase_end_timestamp'],
-            'voteSelectionStartTimestamp': row['vote_selection_start_timestamp'],
-            'voteSelectionEndTimestamp': row['vote_selection_end_timestamp'],
-            'liarVotes': json.loads(row['liar_votes']),
-            'used_question_indexes': json.loads(row['used_question_indexes']),
-            'current_round': row['current_round'],
-            'total_rounds': row['total_rounds'],
-            'player_scores': json.loads(row['player_scores']) if row['player_scores'] else {},  # ✅ ADD
-            'round_history': json.loads(row['round_history']) if row['round_history'] else []  # ✅ ADD
-        }
+        pending = self._dirty.get(room_id)
+        if dirty is None:
+            self._dirty[room_id] = None
+        elif pending is not None:
+            pending.update(dirty)
         
-        return room_data
+        last_phase = self._written.get(room_id, {}).get('phase')
+        if room_data.get('phase', 'waiting') != last_phase:
+            self.persist_room(room_id, self._dirty.get(room_id))
+            self._dirty[room_id] = set()
     
-    def update_room(self, room_id, room_data):
-        """Update a room in the database."""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    def update_room_fields(self, room_id, fields):
+        """
+        Apply a {room key: value} update to the live room and record only
+        those keys as dirty.
+        """
+        room_data = self._rooms.get(room_id)
+        if room_data is None:
+            return
         
-        cursor.execute('''
-            UPDATE rooms SET
-                players = ?, host_id = ?, phase = ?, language = ?, imposter_id = ?, impostor_ids = ?, roles = ?,
-                questions = ?, answers = ?, votes = ?, results = ?, lobby_events = ?,
-                main_question = ?, ready_to_vote = ?, settings = ?,
-                question_phase_start_timestamp = ?, question_phase_end_timestamp = ?,
-                voting_phase_start_timestamp = ?, voting_phase_end_timestamp = ?,
-                vote_selection_start_timestamp = ?, vote_selection_end_timestamp = ?,
-                liar_votes = ?, used_question_indexes = ?,
-                current_round = ?, total_rounds = ?, player_scores = ?, round_history = ?
-            WHERE room_id = ?
-        ''', (
-            json.dumps(room_data.get('players', [])),
-            room_data.get('host_id', ''),
-            room_data.get('phase', 'waiting'),
-            room_data.get('language', 'en'),
-            room_data.get('imposter_id'),
-            json.dumps(room_data.get('impostor_ids', [])),  # Add this
-            json.dumps(room_data.get('roles', {})),
-            json.dumps(room_data.get('questions', {})),
-            json.dumps(room_data.get('answers', {})),
-            json.dumps(room_data.get('votes', {})),
-            json.dumps(room_data.get('results', {})),
-            json.dumps(room_data.get('lobby_events', [])),
-            room_data.get('main_question'),
-            json.dumps(room_data.get('ready_to_vote', [])),
-            json.dumps(room_data.get('settings', {})),
-            room_data.get('questionPhaseStartTimestamp'),
-            room_data.get('questionPhaseEndTimestamp'),
-            room_data.get('votingPhaseStartTimestamp'),
-            room_data.get('votingPhaseEndTimestamp'),
-            room_data.get('voteSelectionStartTimestamp'),
-            room_data.get('voteSelectionEndTimestamp'),
-            json.dumps(room_data.get('liarVotes', {})),
-            json.dumps(room_data.get('used_question_indexes', [])),
-            room_data.get('current_round', 1),
-            room_data.get('total_rounds', 5),
-            json.dumps(room_data.get('player_scores', {})),  # Add this
-            json.dumps(room_data.get('round_history', [])),  # Add this
-            room_id
-        ))
+        room_data.update(fields)
+        self.update_room(room_id, room_data, dirty=fields.keys())
+    
+    def persist_room(self, room_id, dirty=None):
+        """
+        Write the room's current state to SQLite.
+        Only columns whose serialized value differs from the last write are sent.
+        Pass 'dirty' (a set of room keys) to limit serialization to those fields.
+        """
+        room_data = self._rooms.get(room_id)
+        if room_data is None:
+            return
         
-        conn.commit()
-        conn.close()
+        written = self._written.setdefault(room_id, {})
+        changes = {}
+        for key, column, default, is_json in ROOM_FIELDS:
+            if dirty is not None and key not in dirty:
+                continue
+            value = _serialize_field(room_data, key, default, is_json)
+            if column not in written or written[column] != value:
+                changes[column] = value
+        
+        if not changes:
+            return
+        
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(_update_room_sql(tuple(changes)), (*changes.values(), room_id))
+            
+            conn.commit()
+        
+        written.update(changes)
     
     def delete_room(self, room_id):
         """Delete a room from the database."""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute('DELETE FROM rooms WHERE room_id = ?', (room_id,))
+            cursor.execute(_DELETE_ROOM_SQL, (room_id,))
         
-        conn.commit()
-        conn.close()
+            conn.commit()
+        
+        self._rooms.pop(room_id, None)
+        self._written.pop(room_id, None)
+        self._dirty.pop(room_id, None)
+        self._versions.pop(room_id, None)
+    
+    def room_version(self, room_id):
+        """Get the room's write counter; it changes whenever update_room stores the room."""
+        return self._versions.get(room_id, 0)
     
     def get_all_room_ids(self):
-        """Get all room IDs from the database."""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT room_id FROM rooms')
-        rows = cursor.fetchall()
-        conn.close()
-        
-        return [row['room_id'] for row in rows]
+        """Get all room IDs, straight from the in-memory rooms (no query needed)."""
+        return list(self._rooms)
     
     def room_exists(self, room_id):
-        """Check if a room exists in the database."""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT 1 FROM rooms WHERE room_id = ?', (room_id,))
-        exists = cursor.fetchone() is not None
-        conn.close()
-        
-        return exists
+        """Check if a room exists, as a dict lookup on the in-memory rooms."""
+        return room_id in self._rooms
@@ -2,11 +2,42 @@
 Core game logic and state management for the Dai Maou Liar Game.
 """
 
+import copy
+import logging
+import orjson
 import time
 import random
-from threading import Lock
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+from threading import Lock, RLock
 
-from utils.helpers import get_question_pair
+from utils.helpers import get_question_pair, get_players_by_id, get_active_players, add_lobby_event
+
+logger = logging.getLogger(__name__)
+
+# Same-phase state updates arriving within this window go out as one broadcast
+STATE_EMIT_DEBOUNCE_SECONDS = 0.05
+
+# Rooms whose last built state is kept for reuse (least recently used dropped first)
+STATE_CACHE_MAX_ROOMS = 1024
+
+
+@lru_cache(maxsize=None)
+def _mayhem_outcomes(player_count):
+    """
+    Mayhem impostor-count distribution for a player count, resolved once per count:
+    (possible impostor counts, cumulative weights in percent).
+    """
+    n = player_count
+    if n == 4:
+        # 0: 10%, 3 of 4: 20%, 2: 60%, 1: 10%
+        return (0, 3, 2, 1), (10, 30, 90, 100)
+    if n <= 6:
+        # 5-6 players: 0: 5%, all but 1: 5%, all but 2: 15%, half: 45%, up to 3: 30%
+        return (0, n - 1, n - 2, n // 2, min(3, n - 2)), (5, 10, 25, 70, 100)
+    # 7+ players: 0: 3%, all but 1: 5%, all but 2: 10%, half: 22%, two-thirds: 30%, one-third: 30%
+    return (0, n - 1, n - 2, n // 2, (n * 2) // 3, n // 3), (3, 8, 18, 40, 70, 100)
 
 
 class GameManager:
@@ -15,11 +46,76 @@ class GameManager:
     def __init__(self, db_manager, socketio):
         self.db_manager = db_manager
         self.socketio = socketio
-        self.lock = Lock()
+        # One lock per room so unrelated rooms never wait on each other:
+        # room_id -> [RLock, number of threads holding or waiting on it]
+        self._room_locks = {}
+        self._room_locks_guard = Lock()
+        # (phase, encoded state) of the last broadcast per room, to skip identical re-sends
+        self._last_emitted_state = {}
+        # room_id -> (round, {sid: (role, question)}) of personal info already sent this question phase
+        self._personal_info_sent = {}
+        # Rooms with a coalesced broadcast already scheduled
+        self._pending_emits = set()
+        self._pending_emits_guard = Lock()
+        # room_id -> (room, version, state): get_room_state reuses a state until the room is written again
+        self._state_cache = OrderedDict()
+        self._state_cache_guard = Lock()
+        # socket id -> {room_id: player_id} for every seat it holds, so disconnects skip the room scan
+        self._sid_seats = {}
+    
+    @contextmanager
+    def room_lock(self, room_id):
+        """
+        Holds the lock guarding a single room for the 'with' block.
+        Reentrant so a timer callback holding it can call back into the
+        transition and emit helpers for the same room.
+        The lock is shared by everyone holding or waiting on it, and dropped when
+        the last of them leaves and the room doesn't exist (never created, or
+        deleted), so ids sent for unknown rooms leave nothing behind.
+        """
+        with self._room_locks_guard:
+            entry = self._room_locks.get(room_id)
+            if entry is None:
+                entry = self._room_locks[room_id] = [RLock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._room_locks_guard:
+                entry[1] -= 1
+                if entry[1] == 0 and not self.db_manager.room_exists(room_id):
+                    del self._room_locks[room_id]
+    
+    def seat_player(self, sid, room_id, player_id):
+        """Records that a socket is seated as 'player_id' in 'room_id' (a socket may hold several seats)."""
+        self._sid_seats.setdefault(sid, {})[room_id] = player_id
     
-    def get_player_info_by_id(self, players_list, player_id):
-        """Helper function to find a player dictionary in a list by their ID."""
-        return next((p for p in players_list if p["id"] == player_id), None)
+    def unseat_player(self, sid, room_id):
+        """Forgets a socket's seat in one room and returns its (room_id, player_id), or None."""
+        seats = self._sid_seats.get(sid)
+        if not seats or room_id not in seats:
+            return None
+        player_id = seats.pop(room_id)
+        if not seats:
+            self._sid_seats.pop(sid, None)
+        return room_id, player_id
+    
+    def unseat_socket(self, sid):
+        """Forgets every seat a socket held and returns them as (room_id, player_id) pairs."""
+        return list(self._sid_seats.pop(sid, {}).items())
+    
+    def delete_room(self, room_id):
+        """
+        Deletes a room and its cached state. Called with the room's lock held;
+        the lock itself is dropped by room_lock once nobody holds or waits on it,
+        so a room recreated under the same id keeps using that one lock.
+        """
+        self.db_manager.delete_room(room_id)
+        self._last_emitted_state.pop(room_id, None)
+        self._personal_info_sent.pop(room_id, None)
+        with self._state_cache_guard:
+            self._state_cache.pop(room_id, None)
     
     def get_room_state(self, room_id, room=None):
         """
@@ -27,172 +123,253 @@ class GameManager:
         It is used in every state emission.
         Accepts an optional 'room' dictionary to avoid redundant database reads.
         """
-        with self.lock:
+        # Hold the room lock only while copying; the projection below runs lock-free
+        with self.room_lock(room_id):
             if room is None:
                 room = self.db_manager.get_room(room_id)
             if not room:
                 return None
+            
+            # Every write goes through db_manager.update_room, which bumps the version
+            live_room = room
+            version = self.db_manager.room_version(room_id)
+            with self._state_cache_guard:
+                cached = self._state_cache.get(room_id)
+                hit = cached is not None and cached[0] is live_room and cached[1] == version
+                if hit:
+                    self._state_cache.move_to_end(room_id)
+            
+            room = None if hit else self._snapshot_room(live_room)
+            # A handler that mutates the room without update_room leaves the cache stale;
+            # with DEBUG logging every hit is checked against a fresh build
+            if hit and logger.isEnabledFor(logging.DEBUG):
+                room = self._snapshot_room(live_room)
+                if self._build_state(room_id, room) != cached[2]:
+                    logger.error("❌ Stale cached state for room %s: it changed without update_room", room_id)
+                    hit = False
+            if hit:
+                return cached[2]
+
+        state = self._build_state(room_id, room)
+
+        with self._state_cache_guard:
+            self._state_cache[room_id] = (live_room, version, state)
+            self._state_cache.move_to_end(room_id)
+            if len(self._state_cache) > STATE_CACHE_MAX_ROOMS:
+                self._state_cache.popitem(last=False)
+
+        return state
+    
+    def _build_state(self, room_id, room):
+        """
+        Builds the client state for a room snapshot (see _snapshot_room).
+        
+        Args:
+            room_id (str): Room the state is for
+            room (dict): Snapshot of the room, safe to read without the lock
+        
+        Returns:
+            dict: The state sent in update_game_state
+        """
+        phase = room["phase"]
+        answers = room["answers"]
+        question_start = room["questionPhaseStartTimestamp"]
+
+        # One pass over the players builds both the id index and the active list
+        # 🔧 CRITICAL: Only show active players in state
+        players_by_id = {}
+        active_players = []
+        for p in room["players"]:
+            players_by_id[p["id"]] = p
+            if not p.get("disconnected"):
+                active_players.append(p)
+        
+        state = {
+            "roomId": room_id,
+            "phase": phase,
+            "players": active_players,  # ✅ Only active
+            "hostId": room["host_id"],
+            "lobbyEvents": room["lobby_events"],
+            "settings": room["settings"],
+            "currentRound": room["current_round"],
+            "totalRounds": room["total_rounds"],
+            "language": room["language"]
+        }
 
-            # 🔧 CRITICAL: Only show active players in state
-            active_players = [p for p in room["players"] if not p.get("disconnected")]
+        # Add phase-specific data
+        if phase == "question":
+            state["questionPhaseStartTimestamp"] = question_start
+            state["questionPhaseEndTimestamp"] = room["questionPhaseEndTimestamp"]
+
+            # 🔧 FIX: Only count submissions from ACTIVE players
+            # One pass over the answers builds the list; its length is the count
+            answers_list = self._build_answers_list(answers, players_by_id, active_only=True)
             
-            state = {
-                "roomId": room_id,
-                "phase": room["phase"],
-                "players": active_players,  # ✅ Only active
-                "hostId": room["host_id"],
-                "lobbyEvents": room["lobby_events"],
-                "settings": room.get("settings", {}),
-                "currentRound": room.get("current_round", 1),
-                "totalRounds": room.get("total_rounds", 5),
-                "language": room.get("language", "en")
-            }
-
-            if room["phase"] == "question":
-                state["questionPhaseStartTimestamp"] = room.get("questionPhaseStartTimestamp")
-                state["questionPhaseEndTimestamp"] = room.get("questionPhaseEndTimestamp")
-
-                # 🔧 FIX: Only count submissions from ACTIVE players
-                active_player_ids = {p["id"] for p in active_players}
-                active_answers = {pid: ans for pid, ans in room.get("answers", {}).items() 
-                                if pid in active_player_ids}
-                
-                state["submittedCount"] = len(active_answers)
-                
-                # Build answers list (only active players)
-                answers_list = []
-                for player_id, answer in active_answers.items():
-                    player = self.get_player_info_by_id(room["players"], player_id)
-                    if player and not player.get("disconnected"):
-                        answers_list.append({
-                            "playerId": player_id,
-                            "name": player["name"],
-                            "answer": answer
-                        })
-                state["answers"] = answers_list
-
-            # Add phase-specific data
-            if room["phase"] == "voting":
-                state["questionPhaseStartTimestamp"] = room.get("questionPhaseStartTimestamp")
-                state["votingPhaseStartTimestamp"] = room.get("votingPhaseStartTimestamp")
-                state["votingPhaseEndTimestamp"] = room.get("votingPhaseEndTimestamp")
-
-                answers_list = []
-                for player_id, answer in room.get("answers", {}).items():
-                    player = self.get_player_info_by_id(room["players"], player_id)
-                    if player:
-                        answers_list.append({
-                            "playerId": player_id,
-                            "name": player["name"],
-                            "answer": answer
-                        })
-                state["answers"] = answers_list
-                
-                state["mainQuestion"] = room["main_question"]
-                state["ready_to_vote"] = room.get("ready_to_vote", [])
-
-            elif room["phase"] == "vote_selection":
-                state["questionPhaseStartTimestamp"] = room.get("questionPhaseStartTimestamp")
-                state["votingPhaseStartTimestamp"] = room.get("votingPhaseStartTimestamp")
-                state["voteSelectionStartTimestamp"] = room.get("voteSelectionStartTimestamp")
-                state["voteSelectionEndTimestamp"] = room.get("voteSelectionEndTimestamp")
-
-                answers_list = []
-                for player_id, answer in room.get("answers", {}).items():
-                    player = self.get_player_info_by_id(room["players"], player_id)
-                    if player:
-                        answers_list.append({
-                            "playerId": player_id,
-                            "name": player["name"],
-                            "answer": answer
-                        })
-                state["answers"] = answers_list
-                
-                state["mainQuestion"] = room["main_question"]
-                state["ready_to_vote"] = room.get("ready_to_vote", [])
-                state["liarVotes"] = room.get("liarVotes", {})
-                state["impostorIds"] = room.get("impostor_ids", [room.get("imposter_id")] if room.get("imposter_id") else [])
-                state["imposterId"] = room.get("imposter_id")
+            state["submittedCount"] = len(answers_list)
+            state["answers"] = answers_list
+
+        elif phase in ("voting", "vote_selection"):
+            state["questionPhaseStartTimestamp"] = question_start
+            state["votingPhaseStartTimestamp"] = room["votingPhaseStartTimestamp"]
 
-            elif room["phase"] == "results":
-                state["results"] = room["results"]
-                state["questions"] = room["questions"]
+            state["answers"] = self._build_answers_list(answers, players_by_id)
+            
+            state["mainQuestion"] = room["main_question"]
+            state["ready_to_vote"] = room["ready_to_vote"]
+
+            if phase == "voting":
+                state["votingPhaseEndTimestamp"] = room["votingPhaseEndTimestamp"]
+            else:
+                state["voteSelectionStartTimestamp"] = room["voteSelectionStartTimestamp"]
+                state["voteSelectionEndTimestamp"] = room["voteSelectionEndTimestamp"]
+                state["liarVotes"] = room["liarVotes"]
+                state["impostorIds"] = room["impostor_ids"]
+                state["imposterId"] = room["imposter_id"]
+
+        elif phase == "results":
+            state["results"] = room["results"]
+            state["questions"] = room["questions"]
 
         return state
     
+    def _snapshot_room(self, room):
+        """
+        Copies a live room for get_room_state. Must be called under the room lock.
+        The state is built and serialized after the lock is released, so every
+        mutable container the current phase exposes is copied here.
+        """
+        phase = room["phase"]
+        snapshot = dict(room)
+        snapshot["players"] = [dict(p) for p in room["players"]]
+        snapshot["lobby_events"] = list(room["lobby_events"])
+        if room["settings"]:
+            snapshot["settings"] = dict(room["settings"])
+        
+        if phase in ("question", "voting", "vote_selection"):
+            snapshot["answers"] = dict(room["answers"])
+        if phase in ("voting", "vote_selection"):
+            snapshot["ready_to_vote"] = list(room["ready_to_vote"])
+        if phase == "vote_selection":
+            snapshot["liarVotes"] = {target_id: list(voters) for target_id, voters in room["liarVotes"].items()}
+            snapshot["impostor_ids"] = list(room["impostor_ids"])
+        elif phase == "results":
+            snapshot["results"] = copy.deepcopy(room["results"])
+            snapshot["questions"] = dict(room["questions"])
+        
+        return snapshot
+    
+    def _build_answers_list(self, answers, players_by_id, active_only=False):
+        """
+        Pairs each answer with its author's name, skipping players no longer in the room.
+        With active_only, answers from disconnected players are skipped as well.
+        """
+        answers_list = []
+        for player_id, answer in answers.items():
+            player = players_by_id.get(player_id)
+            if player and not (active_only and player.get("disconnected")):
+                answers_list.append({"playerId": player_id, "name": player["name"], "answer": answer})
+        return answers_list
+    
     def emit_state_update(self, room_id, room=None):
-        """Emits the full game state to all clients in a room."""
+        """
+        Emits the full game state to all clients in a room.
+        Phase changes go out immediately; other updates within the same phase are
+        coalesced into one broadcast of the latest state a few ms later.
+        Always emit to the Socket.IO room (or a list of sids), never per socket in a
+        loop, so each payload is encoded once however many players receive it.
+        """
+        # Fetch once; the same room feeds the state and the personal info below
+        if room is None:
+            room = self.db_manager.get_room(room_id)
+        if not room:
+            logger.debug("No room state found for room %s", room_id)
+            return
+        
+        last_emitted = self._last_emitted_state.get(room_id)
+        if last_emitted and last_emitted[0] == room["phase"]:
+            with self._pending_emits_guard:
+                if room_id in self._pending_emits:
+                    return
+                self._pending_emits.add(room_id)
+            self.socketio.start_background_task(self._flush_state_update, room_id)
+            return
+        
+        self._send_state_update(room_id, room)
+    
+    def _flush_state_update(self, room_id):
+        """Background task: wait out the debounce window, then send the room's latest state."""
+        self.socketio.sleep(STATE_EMIT_DEBOUNCE_SECONDS)
+        with self._pending_emits_guard:
+            self._pending_emits.discard(room_id)
+        
+        room = self.db_manager.get_room(room_id)
+        if room:
+            self._send_state_update(room_id, room)
+    
+    def _send_state_update(self, room_id, room):
+        """Builds the room state and broadcasts it, plus personal info in the question phase."""
         room_state = self.get_room_state(room_id, room)
-        if room_state:
-            print(f"DEBUG: Emitting state update for room {room_id}. Phase: {room_state.get('phase')}")
+        if not room_state:
+            logger.debug("No room state found for room %s", room_id)
+            return
+        
+        # Nothing observable changed since the last broadcast (socket ids are part
+        # of the players list, so reconnects still go out); skip the re-send
+        encoded_state = orjson.dumps(room_state, option=orjson.OPT_SORT_KEYS)
+        last_emitted = self._last_emitted_state.get(room_id)
+        if last_emitted and last_emitted[1] == encoded_state:
+            logger.debug("State unchanged for room %s, skipping emit", room_id)
+        else:
+            self._last_emitted_state[room_id] = (room_state["phase"], encoded_state)
+            logger.debug("Emitting state update for room %s. Phase: %s", room_id, room_state["phase"])
             
             # Emit general state to the room
             self.socketio.emit('update_game_state', room_state, room=room_id)
 
-            # Emit personal info (role, question) to each player individually
-            if room is None:  # Fetch if not already provided
-                room = self.db_manager.get_room(room_id)
-            if room and room["phase"] == "question":
-                for p in room["players"]:
-                    personal_info = {
-                        "role": room["roles"].get(p["id"]),
-                        "question": room["questions"].get(p["id"])
-                    }
-                    target_sid = p.get("socket_id")
-                    if target_sid:
-                        self.socketio.emit('personal_game_info', personal_info, room=target_sid)
-        else:
-            print(f"DEBUG: No room state found for room {room_id}")
+        self._send_personal_info(room_id, room, room_state["phase"])
+    
+    def _send_personal_info(self, room_id, room, phase):
+        """
+        Sends each player's role and question during the question phase.
+        Only sockets that have not received their current payload this round are
+        sent to, so a player reconnecting on a new socket gets it even when the
+        broadcast itself was skipped as unchanged.
+        """
+        if phase != "question":
+            self._personal_info_sent.pop(room_id, None)
+            return
+        
+        current_round = room["current_round"]
+        sent_round, sent = self._personal_info_sent.get(room_id, (None, None))
+        if sent_round != current_round:
+            sent = {}
+            self._personal_info_sent[room_id] = (current_round, sent)
+        
+        # Players with the same role see the same question, so group their
+        # sockets and send each distinct payload once (encoded once per group)
+        outbound = {}
+        for p in room["players"]:
+            sid = p.get("socket_id")
+            if sid:
+                personal_key = (room["roles"].get(p["id"]), room["questions"].get(p["id"]))
+                if sent.get(sid) != personal_key:
+                    sent[sid] = personal_key
+                    outbound.setdefault(personal_key, []).append(sid)
+        for (role, question), target_sids in outbound.items():
+            personal_info = {"role": role, "question": question}
+            self.socketio.emit('personal_game_info', personal_info, to=target_sids)
     
     def get_mayhem_impostor_count(self, player_count):
         """
         Determines the number of impostors for Mayhem mode based on random chance.
         Scales with player count for more chaos.
         """
-        rand = random.random() * 100
-        
-        if player_count == 4:
-            # 4 players
-            if rand < 10:  # 10%
-                return 0
-            elif rand < 30:  # 20%
-                return 3  # 3 out of 4
-            elif rand < 90:  # 60%
-                return 2
-            else:  # 10%
-                return 1
-        
-        elif player_count <= 6:
-            # 5-6 players: more variety
-            if rand < 5:  # 5%
-                return 0
-            elif rand < 10:  # 5%
-                return player_count - 1  # Everyone except 1
-            elif rand < 25:  # 15%
-                return player_count - 2  # Everyone except 2
-            elif rand < 70:  # 45%
-                return player_count // 2  # Half the players
-            else:  # 30%
-                return min(3, player_count - 2)
-        
-        else:  # 7+ players
-            # Big games: maximum chaos potential
-            if rand < 3:  # 3%
-                return 0
-            elif rand < 8:  # 5%
-                return player_count - 1  # Everyone except 1 (extreme scenario!)
-            elif rand < 18:  # 10%
-                return player_count - 2  # Everyone except 2
-            elif rand < 40:  # 22%
-                return player_count // 2  # Half the players
-            elif rand < 70:  # 30%
-                return (player_count * 2) // 3  # Two-thirds are impostors
-            else:  # 30%
-                return player_count // 3  # One-third are impostors
+        impostor_counts, cum_weights = _mayhem_outcomes(player_count)
+        return random.choices(impostor_counts, cum_weights=cum_weights)[0]
     
     def transition_to_vote_selection(self, room_id):
         """Transition a room from voting phase to vote selection phase."""
-        with self.lock:
+        with self.room_lock(room_id):
             room = self.db_manager.get_room(room_id)
             if not room:
                 return
@@ -201,43 +378,47 @@ class GameManager:
             if room['phase'] != 'voting':
                 return
             
-            room['phase'] = 'vote_selection'
-            room['voteSelectionStartTimestamp'] = int(time.time() * 1000)
-            room['voteSelectionEndTimestamp'] = int(time.time() * 1000) + 30000  # 30 seconds
-            room["lobby_events"].append("Time to vote for the imposter!")
-            room["liarVotes"] = {}
-            room['ready_to_vote'] = []  # ✅ CLEAR the ready list for vote_selection phase
-            
-            self.db_manager.update_room(room_id, room)
+            now_ms = time.time_ns() // 1_000_000
+            add_lobby_event(room, "Time to vote for the imposter!")
+            # Only these keys change, so only they are re-serialized for the snapshot
+            self.db_manager.update_room_fields(room_id, {
+                'phase': 'vote_selection',
+                'voteSelectionStartTimestamp': now_ms,
+                'voteSelectionEndTimestamp': now_ms + 30000,  # 30 seconds
+                'liarVotes': {},
+                'ready_to_vote': [],  # ✅ CLEAR the ready list for vote_selection phase
+                'lobby_events': room["lobby_events"],
+            })
 
         self.schedule_phase_transition(room_id, 'vote_selection', 30, 'results')
         self.emit_state_update(room_id)
     
     def handle_round_transition(self, room_id):
         """Handle the transition between rounds or to final results."""
-        from utils.helpers import get_question_pair, get_active_players
-        
-        with self.lock:
+        with self.room_lock(room_id):
             room = self.db_manager.get_room(room_id)
             if not room:
                 return
             
-            if room.get('phase') == 'question':
-                print(f"⚠️ Round transition already processed, ignoring duplicate call")
+            if room['phase'] == 'question':
+                logger.warning("⚠️ Round transition already processed, ignoring duplicate call")
                 return
             
-            if room.get('phase') != 'vote_selection':
-                print(f"⚠️ Invalid phase for round transition: {room.get('phase')}")
+            if room['phase'] != 'vote_selection':
+                logger.warning("⚠️ Invalid phase for round transition: %s", room['phase'])
                 return
             
-            current_round = room.get('current_round', 1)
-            total_rounds = room.get('total_rounds', 5)
+            current_round = room['current_round']
+            total_rounds = room['total_rounds']
             
-            print(f"🔄 ROUND TRANSITION - current_round: {current_round}, total_rounds: {total_rounds}")
-            print(f"ROUND {current_round} COMPLETE!")
+            logger.info("🔄 ROUND TRANSITION - current_round: %s, total_rounds: %s", current_round, total_rounds)
+            logger.info("ROUND %s COMPLETE!", current_round)
+
+            # 🆕 Use ACTIVE players only (exclude disconnected); shared by scoring and the next round
+            active_players = get_active_players(room["players"])
 
             # Calculate scores
-            round_scores = self.calculate_round_scores(room)
+            round_scores = self.calculate_round_scores(room, active_players)
             
             # Initialize score tracking if not exists
             if "player_scores" not in room:
@@ -250,63 +431,70 @@ class GameManager:
                 else:
                     room["player_scores"][player_id] = points
             
-            print(f"   Round {current_round} scores: {round_scores}")
-            print(f"   Total scores: {room['player_scores']}")
+            # Room keys touched by this transition, so the snapshot only serializes those
+            dirty = {'player_scores'}
+            # Set only when a next round starts; its question timer is scheduled after the lock
+            answer_time_seconds = None
+            
+            logger.info("   Round %s scores: %s", current_round, round_scores)
+            logger.info("   Total scores: %s", room['player_scores'])
 
             if current_round >= total_rounds:
                 # Game is over
-                print("RESULTS PAGE TIME")
+                logger.info("RESULTS PAGE TIME")
                 room['phase'] = 'results'
                 room['results'] = {
                     'finalRound': current_round,
                     'gameComplete': True,
                     'playerScores': room["player_scores"]  # ✅ ADD THIS
                 }
+                dirty.update(('phase', 'results'))
             else:
                 # Start next round
                 next_round = current_round + 1
                 room['current_round'] = next_round
-                print(f"ROUND {next_round}")
-                
-                # 🆕 Use ACTIVE players only (exclude disconnected)
-                active_players = get_active_players(room["players"])
+                dirty.add('current_round')
+                logger.info("ROUND %s", next_round)
                 
-                print(f"   Active players for round {next_round}: {[p['name'] for p in active_players]}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("   Active players for round %s: %s", next_round, [p['name'] for p in active_players])
                 
                 # Check if enough players remain
                 if len(active_players) < 2:
-                    print("   Not enough active players, ending game")
+                    logger.info("   Not enough active players, ending game")
                     room['phase'] = 'results'
                     room['results'] = {
                         'finalRound': current_round,
                         'gameComplete': True,
                         'reason': 'Not enough players'
                     }
-                    self.db_manager.update_room(room_id, room)
+                    dirty.update(('phase', 'results'))
+                    self.db_manager.update_room(room_id, room, dirty=dirty)
                     self.emit_state_update(room_id)
                     return
                 
-                room_language = room.get("language", "en")
-                q_pair = get_question_pair(used_indexes=room.get("used_question_indexes", []), language=room_language)
+                room_language = room["language"]
+                q_pair = get_question_pair(used_indexes=room["used_question_indexes"], language=room_language)
                 room["main_question"] = q_pair[0]
-
-                if "used_question_indexes" not in room:
-                    room["used_question_indexes"] = []
                 room["used_question_indexes"].append(q_pair[2])
 
 
                 # Determine impostor count based on game mode
-                game_mode = room.get("settings", {}).get("gameMode", "normal")
+                settings = room["settings"]  # Read once; used for mode and answer time below
+                game_mode = settings.get("gameMode", "normal")
                 if game_mode == "mayhem":
                     impostor_count = self.get_mayhem_impostor_count(len(active_players))
                 else:
                     impostor_count = 1
 
-                # 🆕 Select impostors from ACTIVE players only
-                impostors = random.sample(active_players, impostor_count) if impostor_count > 0 else []
-                impostor_ids = [imp["id"] for imp in impostors]
-
-                print(f"   Selected impostors: {[imp['name'] for imp in impostors]}")
+                # 🆕 Select impostors from ACTIVE players only, sampling their ids directly
+                active_ids = [p["id"] for p in active_players]
+                if impostor_count == 1:
+                    # Normal mode (and most Mayhem rounds): a single pick, no sampling
+                    impostor_ids = [random.choice(active_ids)]
+                else:
+                    impostor_ids = random.sample(active_ids, impostor_count) if impostor_count > 0 else []
+                impostor_id_set = set(impostor_ids)  # O(1) membership in the role assignment
 
                 # Store impostor info
                 room["impostor_ids"] = impostor_ids
@@ -314,65 +502,85 @@ class GameManager:
 
                 # 🆕 Assign roles and questions to ALL players (including disconnected)
                 # Disconnected players keep their role/question if they rejoin
-                for p in room["players"]:  # Iterate all players
-                    is_imposter = p["id"] in impostor_ids
-                    room["roles"][p["id"]] = "imposter" if is_imposter else "normal"
-                    room["questions"][p["id"]] = q_pair[1] if is_imposter else q_pair[0]
-                    
-                    status = "DISCONNECTED" if p.get("disconnected") else "active"
-                    print(f"   {p['name']} ({status}): {room['roles'][p['id']]} - Q: {room['questions'][p['id']][:50]}...")
+                normal_question, imposter_question = q_pair[0], q_pair[1]
+                room["roles"] = {
+                    p["id"]: "imposter" if p["id"] in impostor_id_set else "normal"
+                    for p in room["players"]
+                }
+                room["questions"] = {
+                    p["id"]: imposter_question if p["id"] in impostor_id_set else normal_question
+                    for p in room["players"]
+                }
+
+                if logger.isEnabledFor(logging.DEBUG):
+                    players_by_id = get_players_by_id(room)
+                    logger.debug("   Selected impostors: %s", [players_by_id[pid]['name'] for pid in impostor_ids])
+                    for p in room["players"]:
+                        status = "DISCONNECTED" if p.get("disconnected") else "active"
+                        logger.debug("   %s (%s): %s - Q: %s...", p['name'], status, room['roles'][p['id']], room['questions'][p['id']][:50])
 
                 # Clear previous round data
                 room["answers"], room["votes"] = {}, {}
                 room["liarVotes"] = {}
                 room["ready_to_vote"] = []
                 room["phase"] = "question"
-                room["questionPhaseStartTimestamp"] = int(time.time() * 1000)
-                answer_time_seconds = room.get("settings", {}).get("answerTime", 60)
-                room["questionPhaseEndTimestamp"] = int(time.time() * 1000) + (answer_time_seconds * 1000)
-                room["lobby_events"].append(f"Round {next_round} has started!")
+                now_ms = time.time_ns() // 1_000_000
+                room["questionPhaseStartTimestamp"] = now_ms
+                answer_time_seconds = settings.get("answerTime", 60)
+                room["questionPhaseEndTimestamp"] = now_ms + (answer_time_seconds * 1000)
+                add_lobby_event(room, f"Round {next_round} has started!")
+                dirty.update((
+                    'main_question', 'used_question_indexes', 'impostor_ids', 'imposter_id',
+                    'roles', 'questions', 'answers', 'votes', 'liarVotes', 'ready_to_vote',
+                    'phase', 'questionPhaseStartTimestamp', 'questionPhaseEndTimestamp', 'lobby_events'
+                ))
                 
         # Update room in database
-        self.db_manager.update_room(room_id, room)
+        self.db_manager.update_room(room_id, room, dirty=dirty)
 
-        if room.get('phase') == 'question':
-            answer_time_seconds = room.get("settings", {}).get("answerTime", 60)
+        if answer_time_seconds is not None:
             self.schedule_phase_transition(room_id, 'question', answer_time_seconds, 'voting')
 
         self.emit_state_update(room_id)
 
-    def calculate_round_scores(self, room):
-        """Calculate scores for the round based on voting results."""
-        game_mode = room.get("settings", {}).get("gameMode", "normal")
-        impostor_ids = room.get("impostor_ids", [])
-        liar_votes = room.get("liarVotes", {})
+    def calculate_round_scores(self, room, active_players=None):
+        """
+        Calculate scores for the round based on voting results.
+        Pass 'active_players' if the caller already filtered them, to skip a second scan.
+        """
+        game_mode = room["settings"].get("gameMode", "normal")
+        impostor_ids = room["impostor_ids"]
+        impostor_set = frozenset(impostor_ids)
+        liar_votes = room["liarVotes"]
         players = room["players"]
 
         # Safety check
         if not players:
-            print("⚠️ No players in room, returning empty scores")
+            logger.warning("⚠️ No players in room, returning empty scores")
             return {}
         
-        from utils.helpers import get_active_players
-        active_players = get_active_players(players)
-        active_player_ids = [p["id"] for p in active_players]
+        if active_players is None:
+            active_players = get_active_players(room["players"])
+        active_player_ids = frozenset(p["id"] for p in active_players)
         
         # FIX: Initialize scores for ALL players (including disconnected)
         scores = {p["id"]: 0 for p in players}  # Changed from active_players to players
         
+        # Invert the votes once: voter -> distinct targets they voted for
+        voter_targets = {}
+        for target_id, voter_list in liar_votes.items():
+            for voter_id in voter_list:
+                voter_targets.setdefault(voter_id, set()).add(target_id)
+        
         # Special case: Zero impostors
         if len(impostor_ids) == 0:
-            voters = set()
-            for target_id, voter_list in liar_votes.items():
-                voters.update(voter_list)
-            
+            # Every vote here is wrong: each other player a voter accused costs a point
             for player_id in active_player_ids:
-                if player_id not in voters:
+                targets = voter_targets.get(player_id)
+                if targets is None:
                     scores[player_id] += 2
                 else:
-                    wrong_votes = sum(1 for target_id, voters_list in liar_votes.items() 
-                                    if player_id in voters_list and target_id != player_id)
-                    scores[player_id] -= wrong_votes
+                    scores[player_id] -= len(targets) - (player_id in targets)
             
             return scores
         
@@ -396,78 +604,61 @@ class GameManager:
         # Award points to voters (only active players can vote)
         if game_mode == "mayhem":
             for player_id in active_player_ids:
-                if player_id in impostor_ids:
+                if player_id in impostor_set:
                     continue
                 
-                correct_votes = 0
-                wrong_votes = 0
-                
-                for target_id, voter_list in liar_votes.items():
-                    if player_id in voter_list and target_id != player_id:
-                        if target_id in impostor_ids:
-                            correct_votes += 1
-                        else:
-                            wrong_votes += 1
+                targets = voter_targets.get(player_id, set()) - {player_id}
+                correct_votes = len(targets.intersection(impostor_set))
+                wrong_votes = len(targets) - correct_votes
                 
                 scores[player_id] += correct_votes - wrong_votes
         else:
             # Normal mode
             for player_id in active_player_ids:
-                if player_id in impostor_ids:
+                if player_id in impostor_set:
                     continue
                 
-                voted_correctly = False
-                for impostor_id in impostor_ids:
-                    if player_id in liar_votes.get(impostor_id, []) and player_id != impostor_id:
-                        voted_correctly = True
-                        break
+                # Non-impostor here, so any impostor among their targets is someone else
+                voted_correctly = not voter_targets.get(player_id, set()).isdisjoint(impostor_set)
                 
                 if voted_correctly:
                     scores[player_id] += 1
         
         return scores
 
-    def get_player_name(self, players, player_id):
-        """Helper to get player name by ID."""
-        player = next((p for p in players if p["id"] == player_id), None)
-        return player["name"] if player else "Unknown"
-    
     def schedule_phase_transition(self, room_id, phase_name, duration_seconds, next_phase):
         """Schedule automatic phase transition after duration."""
-        import threading
         
         def transition_callback():
-            time.sleep(duration_seconds)
+            # socketio.sleep yields to the async server (a green thread under eventlet)
+            # instead of parking a whole OS thread for the length of the phase
+            self.socketio.sleep(duration_seconds)
             
-            # Use socketio to handle the actual transition in main thread context
-            def do_transition():
-                with self.lock:
-                    room = self.db_manager.get_room(room_id)
-                    if not room or room['phase'] != phase_name:
-                        return
+            with self.room_lock(room_id):
+                room = self.db_manager.get_room(room_id)
+                if not room or room['phase'] != phase_name:
+                    return
+                
+                logger.info("⏱️ SERVER: %s timer expired, transitioning to %s", phase_name, next_phase)
+                
+                if next_phase == 'voting':
+                    room["phase"] = "voting"
+                    now_ms = time.time_ns() // 1_000_000
+                    room["votingPhaseStartTimestamp"] = now_ms
+                    discuss_time = room["settings"].get("discussTime", 180)
+                    room["votingPhaseEndTimestamp"] = now_ms + (discuss_time * 1000)
+                    add_lobby_event(room, "Time's up! Moving to voting.")
+                    room['ready_to_vote'] = []
+                    self.db_manager.update_room(room_id, room)
+                    self.emit_state_update(room_id, room)
+                    # Schedule next
+                    self.schedule_phase_transition(room_id, 'voting', discuss_time, 'vote_selection')
                     
-                    print(f"⏱️ SERVER: {phase_name} timer expired, transitioning to {next_phase}")
+                elif next_phase == 'vote_selection':
+                    self.transition_to_vote_selection(room_id)
                     
-                    if next_phase == 'voting':
-                        room["phase"] = "voting"
-                        room["votingPhaseStartTimestamp"] = int(time.time() * 1000)
-                        discuss_time = room.get("settings", {}).get("discussTime", 180)
-                        room["votingPhaseEndTimestamp"] = int(time.time() * 1000) + (discuss_time * 1000)
-                        room["lobby_events"].append("Time's up! Moving to voting.")
-                        room['ready_to_vote'] = []
-                        self.db_manager.update_room(room_id, room)
-                        self.emit_state_update(room_id, room)
-                        # Schedule next
-                        self.schedule_phase_transition(room_id, 'voting', discuss_time, 'vote_selection')
-                        
-                    elif next_phase == 'vote_selection':
-                        self.transition_to_vote_selection(room_id)
-                        
-                    elif next_phase == 'results':
-                        self.handle_round_transition(room_id)
-            
-            # Call transition in socketio's thread context
-            self.socketio.start_background_task(do_transition)
+                elif next_phase == 'results':
+                    self.handle_round_transition(room_id)
         
-        threading.Thread(target=transition_callback, daemon=True).start()
-        print(f"⏱️ SERVER: Scheduled {phase_name} -> {next_phase} in {duration_seconds}s")
\ No newline at end of file
+        self.socketio.start_background_task(transition_callback)
+        logger.debug("⏱️ SERVER: Scheduled %s -> %s in %ss", phase_name, next_phase, duration_seconds)
\ No newline at end of file
@@ -2,10 +2,16 @@
 Socket event handlers for connection management operations.
 """
 
+import logging
 import time
 from flask import request
 from flask_socketio import emit, join_room
-from utils.helpers import get_active_players
+from utils.helpers import get_players_by_id, get_active_players, add_lobby_event
+
+logger = logging.getLogger(__name__)
+
+# Seconds a player disconnected mid-game can take to rejoin before losing their seat
+RECONNECT_TIMEOUT_SECONDS = 30
 
 
 class ConnectionHandler:
@@ -18,132 +24,177 @@ class ConnectionHandler:
     
     def handle_connect(self):
         """Handle client connection."""
-        print(f"Client connected: {request.sid}")
+        logger.info("Client connected: %s", request.sid)
     
     def handle_disconnect(self, reason=None):
         """Handle client disconnection."""
-        print(f"Client disconnected: {request.sid} (reason: {reason})")
+        logger.info("Client disconnected: %s (reason: %s)", request.sid, reason)
         
-        with self.game_manager.lock:
-            room_to_update = None
-            for room_id in self.db_manager.get_all_room_ids():
-                room = self.db_manager.get_room(room_id)
-                if not room:
-                    continue
-                    
-                player_to_update = next((p for p in room["players"] if p.get("socket_id") == request.sid), None)
+        # O(1) lookup of the seats this socket held, instead of scanning every room
+        for room_id, player_id in self.game_manager.unseat_socket(request.sid):
+            self._disconnect_seat(room_id, player_id)
+    
+    def _disconnect_seat(self, room_id, player_id):
+        """Handle one seat of a disconnected socket: drop or mark the player in that room."""
+        # Only the room mutation runs under the lock; sends happen once it is released
+        solo_player_sid = None
+        with self.game_manager.room_lock(room_id):
+            room = self.db_manager.get_room(room_id)
+            if not room:
+                return
+            
+            player_to_update = get_players_by_id(room).get(player_id)
+            if not player_to_update or player_to_update.get("socket_id") != request.sid:
+                return
+            
+            player_name = player_to_update["name"]
+            
+            # If in waiting phase, remove completely
+            if room["phase"] == "waiting":
+                room["players"] = [p for p in room["players"] if p["id"] != player_id]
+                
+                if not room["players"]:
+                    self.game_manager.delete_room(room_id)
+                    logger.info("Room %s is empty and has been removed.", room_id)
+                    return
+                
+                # Lobby messages for this disconnect are collected and appended in one go
+                events = [f"{player_name} has left the game."]
+                if player_id == room["host_id"]:
+                    room["host_id"] = room["players"][0]["id"]
+                    events.append(f"{room['players'][0]['name']} is the new host.")
+                add_lobby_event(room, *events)
+                
+                self.db_manager.update_room(room_id, room, dirty={'players', 'host_id', 'lobby_events'})
+            else:
+                # For active game: Mark as disconnected
+                logger.info("Player %s disconnected during %s phase", player_name, room['phase'])
+                # One clock read per disconnect: seconds for the reconnect window, ms for phase timestamps
+                now_ns = time.time_ns()
+                disconnect_time = now_ns / 1_000_000_000
+                player_to_update["disconnected"] = True
+                player_to_update["disconnect_time"] = disconnect_time
+                player_to_update.pop("socket_id", None)
+                
+                # Save submission state
+                was_ready = player_id in room["ready_to_vote"]
+                player_to_update["had_submitted"] = player_id in room["answers"]
+                player_to_update["was_ready"] = was_ready
+                
+                # Remove game data based on phase
+                # Only remove answers if in question phase (answers aren't public yet)
+                if room["phase"] == "question" and player_id in room.get("answers", {}):
+                    del room["answers"][player_id]
+                    logger.debug("   Removed answer (question phase)")
+                
+                # Always remove votes and ready status (can be resubmitted)
+                if player_id in room.get("votes", {}):
+                    del room["votes"][player_id]
+                
+                if was_ready:
+                    room["ready_to_vote"].remove(player_id)
+                    logger.debug("   Removed from ready_to_vote")
+                
+                # Remove from liar votes
+                liar_votes = room["liarVotes"]
+                for voters in liar_votes.values():
+                    if player_id in voters:
+                        voters.remove(player_id)
+                liar_votes.pop(player_id, None)
+                
+                active_players = get_active_players(room["players"])
+                
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("   Active players remaining: %s - %s", len(active_players), [p['name'] for p in active_players])
+
+                if len(active_players) == 1:
+                    solo_player_sid = active_players[0].get("socket_id")
+                    solo_player_language = room.get('language', 'en')
+                    self.game_manager.delete_room(room_id)
+                    logger.info("Room %s had only 1 active player and was deleted.", room_id)
+                elif not active_players:
+                    self.game_manager.delete_room(room_id)
+                    logger.info("Room %s has no active players and has been removed.", room_id)
+                    return
+                else:
+                    events = [f"{player_name} has disconnected."]
+                    if player_id == room["host_id"]:
+                        room["host_id"] = active_players[0]["id"]
+                        events.append(f"{active_players[0]['name']} is the new host.")
+                    add_lobby_event(room, *events)
 
-                if player_to_update:
-                    player_id = player_to_update["id"]
-                    player_name = player_to_update["name"]
-                    
-                    # If in waiting phase, remove completely
-                    if room["phase"] == "waiting":
-                        room["players"] = [p for p in room["players"] if p["id"] != player_id]
-                        room["lobby_events"].append(f"{player_name} has left the game.")
-                        
-                        if not room["players"]:
-                            self.db_manager.delete_room(room_id)
-                            print(f"Room {room_id} is empty and has been removed.")
-                            return
-                        
-                        if player_id == room["host_id"] and room["players"]:
-                            room["host_id"] = room["players"][0]["id"]
-                            new_host_name = room["players"][0]["name"]
-                            room["lobby_events"].append(f"{new_host_name} is the new host.")
-                        
-                        self.db_manager.update_room(room_id, room)
-                        room_to_update = room_id
-                        break
-                    
-                    # For active game: Mark as disconnected
-                    print(f"Player {player_name} disconnected during {room['phase']} phase")
-                    player_to_update["disconnected"] = True
-                    player_to_update["disconnect_time"] = time.time()
-                    player_to_update.pop("socket_id", None)
-                    
-                    # Save submission state
-                    player_to_update["had_submitted"] = player_id in room.get("answers", {})
-                    player_to_update["was_ready"] = player_id in room.get("ready_to_vote", [])
-                    
-                    room["lobby_events"].append(f"{player_name} has disconnected.")
-                    
-                    # Remove game data based on phase
-                    # Only remove answers if in question phase (answers aren't public yet)
-                    if room["phase"] == "question" and player_id in room.get("answers", {}):
-                        del room["answers"][player_id]
-                        print(f"   Removed answer (question phase)")
-                    
-                    # Always remove votes and ready status (can be resubmitted)
-                    if player_id in room.get("votes", {}):
-                        del room["votes"][player_id]
-                    
-                    if player_id in room.get("ready_to_vote", []):
-                        room["ready_to_vote"].remove(player_id)
-                        print(f"   Removed from ready_to_vote")
-                    
-                    # Remove from liar votes
-                    if "liarVotes" in room:
-                        for target_id, voters in list(room["liarVotes"].items()):
-                            if player_id in voters:
-                                voters.remove(player_id)
-                        if player_id in room["liarVotes"]:
-                            del room["liarVotes"][player_id]
-                    
-                    # Clean up expired players
-                    current_time = time.time()
-                    expired_players = [p for p in room["players"] 
-                                    if p.get("disconnected") and (current_time - p.get("disconnect_time", 0)) > 30]
-                    
-                    for expired_player in expired_players:
-                        room["players"] = [p for p in room["players"] if p["id"] != expired_player["id"]]
-                        room["lobby_events"].append(f"{expired_player['name']} has been removed (reconnect timeout).")
-                        print(f"   Removed expired player: {expired_player['name']}")
-                    
-                    from utils.helpers import get_active_players
-                    active_players = get_active_players(room["players"])
-                    
-                    print(f"   Active players remaining: {len(active_players)} - {[p['name'] for p in active_players]}")
+                    self.check_phase_transition_after_disconnect(room, room_id, active_players, now_ns // 1_000_000)
 
-                    if len(active_players) == 1:
-                        last_player = active_players[0]
-                        last_player_sid = last_player.get("socket_id")
-                        if last_player_sid:
-                            room_language = room.get('language', 'en')
-                            solo_kick_message = {
-                                'en': 'You were the only player left in the game.',
-                                'ar': '.كنت آخر لاعب في اللعبة'
-                            }.get(room_language, 'You were the only player left in the game.')
+                    # Only these keys can change on a mid-game disconnect (the phase ones via the check above)
+                    self.db_manager.update_room(room_id, room, dirty={
+                        'players', 'host_id', 'lobby_events', 'answers', 'votes', 'ready_to_vote', 'liarVotes',
+                        'phase', 'votingPhaseStartTimestamp', 'voteSelectionStartTimestamp'
+                    })
+                    self.schedule_reconnect_timeout(room_id, player_id, disconnect_time)
 
-                            self.socketio.emit('solo_player_kick', {
-                                'message': solo_kick_message
-                            }, room=last_player_sid)
-                        
-                        self.db_manager.delete_room(room_id)
-                        print(f"Room {room_id} had only 1 active player and was deleted.")
-                        return
-                    
-                    if not active_players:
-                        self.db_manager.delete_room(room_id)
-                        print(f"Room {room_id} has no active players and has been removed.")
-                        return
+        if solo_player_sid:
+            solo_kick_message = {
+                'en': 'You were the only player left in the game.',
+                'ar': '.كنت آخر لاعب في اللعبة'
+            }.get(solo_player_language, 'You were the only player left in the game.')
 
-                    if player_id == room["host_id"] and active_players:
-                        room["host_id"] = active_players[0]["id"]
-                        new_host_name = active_players[0]["name"]
-                        room["lobby_events"].append(f"{new_host_name} is the new host.")
+            self.socketio.emit('solo_player_kick', {
+                'message': solo_kick_message
+            }, room=solo_player_sid)
+            return
 
-                    self.check_phase_transition_after_disconnect(room, room_id, active_players)
+        self.game_manager.emit_state_update(room_id)
 
-                    self.db_manager.update_room(room_id, room)
-                    room_to_update = room_id
-                    break
+    def schedule_reconnect_timeout(self, room_id, player_id, disconnect_time):
+        """Remove a disconnected player once their reconnect window runs out, unless they rejoined."""
         
-        if room_to_update:
-            self.game_manager.emit_state_update(room_to_update)
-
-    def check_phase_transition_after_disconnect(self, room, room_id, active_players):
-        """Check if phase should transition after a player disconnects."""
+        def timeout_callback():
+            self.socketio.sleep(RECONNECT_TIMEOUT_SECONDS)
+            
+            with self.game_manager.room_lock(room_id):
+                room = self.db_manager.get_room(room_id)
+                if not room:
+                    return
+                
+                # A rejoin (or a later disconnect with its own timer) changes disconnect_time
+                player = get_players_by_id(room).get(player_id)
+                if not player or not player.get("disconnected") or player.get("disconnect_time") != disconnect_time:
+                    return
+                
+                room["players"] = [p for p in room["players"] if p["id"] != player_id]
+                logger.info("   Removed expired player: %s", player['name'])
+                
+                # The seat is gone for good, so drop everything the player left behind
+                room.get("answers", {}).pop(player_id, None)
+                room.get("votes", {}).pop(player_id, None)
+                if player_id in room.get("ready_to_vote", []):
+                    room["ready_to_vote"].remove(player_id)
+                liar_votes = room.get("liarVotes", {})
+                for voters in liar_votes.values():
+                    if player_id in voters:
+                        voters.remove(player_id)
+                liar_votes.pop(player_id, None)
+                
+                active_players = get_active_players(room["players"])
+                if not room["players"] or not active_players:
+                    self.game_manager.delete_room(room_id)
+                    logger.info("Room %s has no active players and has been removed.", room_id)
+                    return
+                
+                add_lobby_event(room, f"{player['name']} has been removed (reconnect timeout).")
+                self.check_phase_transition_after_disconnect(room, room_id, active_players, time.time_ns() // 1_000_000)
+                
+                self.db_manager.update_room(room_id, room, dirty={
+                    'players', 'lobby_events', 'answers', 'votes', 'ready_to_vote', 'liarVotes',
+                    'phase', 'votingPhaseStartTimestamp', 'voteSelectionStartTimestamp'
+                })
+            
+            self.game_manager.emit_state_update(room_id)
+        
+        self.socketio.start_background_task(timeout_callback)
+    
+    def check_phase_transition_after_disconnect(self, room, room_id, active_players, now_ms):
+        """Check if phase should transition after a player disconnects (now_ms: the disconnect time in ms)."""
         phase = room["phase"]
         
         if phase == "question":
@@ -151,22 +202,19 @@ class ConnectionHandler:
             answers_count = len(room.get("answers", {}))
             active_count = len(active_players)
             
-            # Get the actual player IDs who have submitted
-            submitted_ids = list(room.get("answers", {}).keys())
-            active_ids = [p["id"] for p in active_players]
-            
-            print(f"   🔍 PHASE TRANSITION CHECK (question):")
-            print(f"      Active players: {active_count} - {[p['name'] for p in active_players]}")
-            print(f"      Active IDs: {active_ids}")
-            print(f"      Submitted count: {answers_count}")
-            print(f"      Submitted IDs: {submitted_ids}")
-            print(f"      All active submitted? {answers_count == active_count and active_count > 0}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("   🔍 PHASE TRANSITION CHECK (question):")
+                logger.debug("      Active players: %s - %s", active_count, [p['name'] for p in active_players])
+                logger.debug("      Active IDs: %s", [p["id"] for p in active_players])
+                logger.debug("      Submitted count: %s", answers_count)
+                logger.debug("      Submitted IDs: %s", list(room.get("answers", {})))
+                logger.debug("      All active submitted? %s", answers_count == active_count and active_count > 0)
             
             if answers_count == len(active_players) and len(active_players) > 0:
-                print(f"   ✅ All active players answered, transitioning to voting")
+                logger.info("   ✅ All active players answered, transitioning to voting")
                 room["phase"] = "voting"
-                room["votingPhaseStartTimestamp"] = int(time.time() * 1000)
-                room["lobby_events"].append("All answers are in! Time to vote.")
+                room["votingPhaseStartTimestamp"] = now_ms
+                add_lobby_event(room, "All answers are in! Time to vote.")
                 room['ready_to_vote'] = []
         
         elif phase == "voting":
@@ -174,16 +222,16 @@ class ConnectionHandler:
             ready_count = len(room.get("ready_to_vote", []))
             active_count = len(active_players)
             
-            print(f"   🔍 PHASE TRANSITION CHECK (voting):")
-            print(f"      Ready count: {ready_count}")
-            print(f"      Active count: {active_count}")
-            print(f"      All active ready? {ready_count == active_count and active_count > 0}")
+            logger.debug("   🔍 PHASE TRANSITION CHECK (voting):")
+            logger.debug("      Ready count: %s", ready_count)
+            logger.debug("      Active count: %s", active_count)
+            logger.debug("      All active ready? %s", ready_count == active_count and active_count > 0)
             
             if ready_count == len(active_players) and len(active_players) > 0:
-                print(f"   ✅ All active players ready, transitioning to vote_selection")
+                logger.info("   ✅ All active players ready, transitioning to vote_selection")
                 room['phase'] = 'vote_selection'
-                room['voteSelectionStartTimestamp'] = int(time.time() * 1000)
-                room["lobby_events"].append("Time to vote for the imposter!")
+                room['voteSelectionStartTimestamp'] = now_ms
+                add_lobby_event(room, "Time to vote for the imposter!")
                 room["liarVotes"] = {}
     
     def handle_rejoin_game(self, data):
@@ -192,17 +240,17 @@ class ConnectionHandler:
         player_id = data.get("playerId")
         timestamp = data.get("timeStamp")
 
-        print(f"🔄 Rejoin request: SID={request.sid}, Room={room_id}, Player={player_id}")
+        logger.info("🔄 Rejoin request: SID=%s, Room=%s, Player=%s", request.sid, room_id, player_id)
 
         if not room_id or not player_id:
             emit('error', {"message": "Room ID and Player ID are required."})
             return
 
         try:
-            with self.game_manager.lock:
+            with self.game_manager.room_lock(room_id):
                 room = self.db_manager.get_room(room_id)
                 if not room:
-                    print(f"❌ Room {room_id} does not exist")
+                    logger.info("❌ Room %s does not exist", room_id)
                     emit('error', {"message": "Room does not exist."})
                     return
                 
@@ -215,43 +263,44 @@ class ConnectionHandler:
                     }, room=request.sid)
                     return
 
-                player_to_rejoin = next((p for p in room["players"] if p["id"] == player_id), None)
+                player_to_rejoin = get_players_by_id(room).get(player_id)
                 
                 if not player_to_rejoin:
-                    print(f"❌ Player {player_id} not found in room {room_id}")
+                    logger.info("❌ Player %s not found in room %s", player_id, room_id)
                     emit('error', {"message": "Player not found in room."})
                     return
 
                 if not player_to_rejoin.get("disconnected"):
-                    print(f"❌ Player {player_id} is not marked as disconnected")
+                    logger.info("❌ Player %s is not marked as disconnected", player_id)
                     emit('error', {"message": "Player is not disconnected."})
                     return
 
                 disconnect_time = player_to_rejoin.get("disconnect_time", 0)
                 elapsed = time.time() - disconnect_time
-                if elapsed > 30:
-                    print(f"❌ Reconnection time window expired ({elapsed:.1f}s)")
+                if elapsed > RECONNECT_TIMEOUT_SECONDS:
+                    logger.info("❌ Reconnection time window expired (%.1fs)", elapsed)
                     emit('error', {"message": "Reconnection time window has expired."})
                     return
 
-                print(f"✅ Player rejoining (disconnected for {elapsed:.1f}s)")
+                logger.info("✅ Player rejoining (disconnected for %.1fs)", elapsed)
 
                 # Restore connection
                 player_to_rejoin["disconnected"] = False
                 player_to_rejoin.pop("disconnect_time", None)
                 player_to_rejoin["socket_id"] = request.sid
+                self.game_manager.seat_player(request.sid, room_id, player_id)
                 
                 # 🔧 FIX: Check if they had already submitted/voted BEFORE disconnecting
                 had_submitted = player_to_rejoin.pop("had_submitted", False)
                 was_ready = player_to_rejoin.pop("was_ready", False)
                 
-                print(f"   Restoring state: had_submitted={had_submitted}, was_ready={was_ready}")
+                logger.debug("   Restoring state: had_submitted=%s, was_ready=%s", had_submitted, was_ready)
                 
                 join_room(room_id)
                 
-                room["lobby_events"].append(f"{player_to_rejoin['name']} has reconnected.")
+                add_lobby_event(room, f"{player_to_rejoin['name']} has reconnected.")
 
-                self.db_manager.update_room(room_id, room)
+                self.db_manager.update_room(room_id, room, dirty={'players', 'lobby_events'})
 
             # Send updated state
             room_state = self.game_manager.get_room_state(room_id)
@@ -276,10 +325,8 @@ class ConnectionHandler:
             }, room=request.sid)
 
             self.game_manager.emit_state_update(room_id)
-            print(f"✅ Rejoin completed for player {player_id}")
+            logger.info("✅ Rejoin completed for player %s", player_id)
             
-        except Exception as e:
-            print(f"❌ Error in rejoin_game: {e}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            logger.exception("❌ Error in rejoin_game")
             emit('error', {"message": "An error occurred during rejoin."})
\ No newline at end of file
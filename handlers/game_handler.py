@@ -2,13 +2,16 @@
 Socket event handlers for game-related operations.
 """
 
+import logging
 import time
 import random
 import uuid
 import threading
 from flask import request
 from flask_socketio import emit
-from utils.helpers import get_question_pair
+from utils.helpers import get_question_pair, get_player_name, get_active_players, add_lobby_event
+
+logger = logging.getLogger(__name__)
 
 
 class GameHandler:
@@ -25,12 +28,10 @@ class GameHandler:
         player_id = data.get("playerId")
         settings = data.get("settings")
 
-        with self.game_manager.lock:
+        with self.game_manager.room_lock(room_id):
             room = self.db_manager.get_room(room_id)
             if not room: 
                 return
-            
-            room["settings"] = settings 
 
             if room["host_id"] != player_id:
                 emit('error_event', {'message': 'Only the host can start the game.'}, room=request.sid)
@@ -39,14 +40,17 @@ class GameHandler:
                 emit('error_event', {'message': 'You need at least 2 players to start.'}, room=request.sid)
                 return
             
+            # Only touch the (live) room once the request is known to be valid
+            room["settings"] = settings 
+            
             # 🆕 Get active players only
-            from utils.helpers import get_active_players
             active_players = get_active_players(room["players"])
             
-            print(f"🎮 GAME START DEBUG:")
-            print(f"   Total players in room: {len(room['players'])}")
-            print(f"   Active players: {len(active_players)} - {[p['name'] for p in active_players]}")
-            print(f"   Game mode: {settings.get('gameMode', 'normal')}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("🎮 GAME START DEBUG:")
+                logger.debug("   Total players in room: %s", len(room['players']))
+                logger.debug("   Active players: %s - %s", len(active_players), [p['name'] for p in active_players])
+                logger.debug("   Game mode: %s", settings.get('gameMode', 'normal'))
             
             room_language = room.get("language", "en")
             q_pair = get_question_pair(used_indexes=room.get("used_question_indexes", []), language=room_language)
@@ -66,36 +70,41 @@ class GameHandler:
             else:
                 impostor_count = 1
 
-            print(f"   Impostor count: {impostor_count}")
+            logger.debug("   Impostor count: %s", impostor_count)
 
             # 🆕 Select impostors from ACTIVE players
             impostors = random.sample(active_players, impostor_count) if impostor_count > 0 else []
             impostor_ids = [imp["id"] for imp in impostors]
+            impostor_id_set = set(impostor_ids)  # O(1) membership in the role loop
 
-            print(f"   Selected impostors: {[imp['name'] for imp in impostors]}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("   Selected impostors: %s", [imp['name'] for imp in impostors])
 
             room["impostor_ids"] = impostor_ids
             room["imposter_id"] = impostor_ids[0] if impostor_ids else None
 
             # Assign roles to ALL players (including any disconnected)
             for p in room["players"]:
-                is_imposter = p["id"] in impostor_ids
+                is_imposter = p["id"] in impostor_id_set
                 room["roles"][p["id"]] = "imposter" if is_imposter else "normal"
                 room["questions"][p["id"]] = q_pair[1] if is_imposter else q_pair[0]
-                print(f"   {p['name']}: {room['roles'][p['id']]} - Q: {room['questions'][p['id']][:50]}...")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("   %s: %s - Q: %s...", p['name'], room['roles'][p['id']], room['questions'][p['id']][:50])
 
             room["answers"], room["votes"], room["results"] = {}, {}, {}
             
-            self.socketio.emit('game_starting', room=room_id)
-            
             room["phase"] = "question"
-            room["questionPhaseStartTimestamp"] = int(time.time() * 1000)
+            now_ms = time.time_ns() // 1_000_000
+            room["questionPhaseStartTimestamp"] = now_ms
             answer_time_seconds = room.get("settings", {}).get("answerTime", 60)
-            room["questionPhaseEndTimestamp"] = int(time.time() * 1000) + (answer_time_seconds * 1000)
-            room["lobby_events"].append("The game has started!")
+            room["questionPhaseEndTimestamp"] = now_ms + (answer_time_seconds * 1000)
+            add_lobby_event(room, "The game has started!")
             
             self.db_manager.update_room(room_id, room)
 
+        # Broadcast outside the lock so other handlers aren't held up by socket writes
+        self.socketio.emit('game_starting', room=room_id)
+
         self.game_manager.schedule_phase_transition(room_id, 'question', answer_time_seconds, 'voting')
 
         self.game_manager.emit_state_update(room_id, room)
@@ -106,48 +115,49 @@ class GameHandler:
         player_id = data.get("playerId")
         answer = data.get("answer")
 
-        with self.game_manager.lock:
+        with self.game_manager.room_lock(room_id):
             room = self.db_manager.get_room(room_id)
             if not room or room["phase"] != "question":
                 return
 
             # ✅ CRITICAL: Only allow submissions during question phase
             if room["phase"] != "question":
-                print(f"⚠️ Cannot submit answer - phase is {room['phase']}, not 'question'")
+                logger.warning("⚠️ Cannot submit answer - phase is %s, not 'question'", room['phase'])
                 return
 
             is_new_submission = player_id not in room["answers"]
             room["answers"][player_id] = answer
 
-            player_name = next((p["name"] for p in room["players"] if p["id"] == player_id), "Someone")
+            player_name = get_player_name(room, player_id, "Someone")
 
             if is_new_submission:
-                room["lobby_events"].append(f"{player_name} submitted their answer.")
+                add_lobby_event(room, f"{player_name} submitted their answer.")
             else:
-                room["lobby_events"].append(f"{player_name} updated their answer.")
+                add_lobby_event(room, f"{player_name} updated their answer.")
 
             # Check if all ACTIVE players have answered
-            from utils.helpers import get_active_players
             active_players = get_active_players(room["players"])
             
-            # Get list of active player IDs for comparison
-            active_player_ids = [p["id"] for p in active_players]
+            # Set of active player IDs for O(1) membership
+            active_player_ids = {p["id"] for p in active_players}
             # Count how many active players have submitted
-            active_submitted = [pid for pid in room["answers"].keys() if pid in active_player_ids]
+            active_submitted_count = sum(1 for pid in room["answers"] if pid in active_player_ids)
             
-            print(f"🔍 SUBMIT CHECK - Total players: {len(room['players'])}, Active: {len(active_players)}")
-            print(f"   Active player IDs: {active_player_ids}")
-            print(f"   All answers from: {list(room['answers'].keys())}")
-            print(f"   Active players who submitted: {active_submitted}")
-            print(f"   Count: {len(active_submitted)} / {len(active_players)}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("🔍 SUBMIT CHECK - Total players: %s, Active: %s", len(room['players']), len(active_players))
+                logger.debug("   Active player IDs: %s", list(active_player_ids))
+                logger.debug("   All answers from: %s", list(room['answers']))
+                logger.debug("   Active players who submitted: %s", [pid for pid in room["answers"] if pid in active_player_ids])
+                logger.debug("   Count: %s / %s", active_submitted_count, len(active_players))
             
-            if len(active_submitted) == len(active_players):
-                print(f"   ✅ All active players submitted - transitioning to voting")
+            if active_submitted_count == len(active_players):
+                logger.info("   ✅ All active players submitted - transitioning to voting")
                 room["phase"] = "voting"
-                room["votingPhaseStartTimestamp"] = int(time.time() * 1000)
+                now_ms = time.time_ns() // 1_000_000
+                room["votingPhaseStartTimestamp"] = now_ms
                 discuss_time_seconds = room.get("settings", {}).get("discussTime", 180)
-                room["votingPhaseEndTimestamp"] = int(time.time() * 1000) + (discuss_time_seconds * 1000)
-                room["lobby_events"].append("All answers are in! Time to vote.")
+                room["votingPhaseEndTimestamp"] = now_ms + (discuss_time_seconds * 1000)
+                add_lobby_event(room, "All answers are in! Time to vote.")
                 room['ready_to_vote'] = [] 
                 
             # Update room in database
@@ -165,13 +175,13 @@ class GameHandler:
         room_id = data.get("roomId")
         player_id = data.get("playerId")
 
-        with self.game_manager.lock:
+        with self.game_manager.room_lock(room_id):
             room = self.db_manager.get_room(room_id)
             if not room or room["phase"] != "question": 
                 return
 
             if room["phase"] != "question":
-                print(f"⚠️ Cannot remove answer - phase is {room['phase']}, not 'question'")
+                logger.warning("⚠️ Cannot remove answer - phase is %s, not 'question'", room['phase'])
                 emit('error_event', {
                     'message': 'Cannot edit answer after question phase has ended.'
                 }, room=request.sid)
@@ -181,8 +191,8 @@ class GameHandler:
             if player_id in room["answers"]:
                 del room["answers"][player_id]
                 
-                player_name = next((p["name"] for p in room["players"] if p["id"] == player_id), "Someone")
-                room["lobby_events"].append(f"{player_name} is editing their answer.")
+                player_name = get_player_name(room, player_id, "Someone")
+                add_lobby_event(room, f"{player_name} is editing their answer.")
                 
                 # Update room in database
                 self.db_manager.update_room(room_id, room)
@@ -195,7 +205,7 @@ class GameHandler:
         voter_id = data.get("playerId")
         voted_for_id = data.get("votedForId")
 
-        with self.game_manager.lock:
+        with self.game_manager.room_lock(room_id):
             room = self.db_manager.get_room(room_id)
             if not room or room["phase"] != "voting": 
                 return
@@ -203,8 +213,8 @@ class GameHandler:
                 return  # Prevent re-submission
 
             room["votes"][voter_id] = voted_for_id
-            voter_name = next((p["name"] for p in room["players"] if p["id"] == voter_id), "Someone")
-            room["lobby_events"].append(f"{voter_name} has cast their vote.")
+            voter_name = get_player_name(room, voter_id, "Someone")
+            add_lobby_event(room, f"{voter_name} has cast their vote.")
             
             # Update room in database
             self.db_manager.update_room(room_id, room)
@@ -219,7 +229,7 @@ class GameHandler:
         if not room_id or not player_id:
             return
 
-        with self.game_manager.lock:
+        with self.game_manager.room_lock(room_id):
             room = self.db_manager.get_room(room_id)
             if not room:
                 return
@@ -228,29 +238,32 @@ class GameHandler:
             if 'ready_to_vote' not in room:
                 room['ready_to_vote'] = []
 
-            # Add player if not already there
-            if player_id not in room['ready_to_vote']:
-                room['ready_to_vote'].append(player_id)
-                player_name = next((p["name"] for p in room["players"] if p["id"] == player_id), "Someone")
-                room["lobby_events"].append(f"{player_name} is ready to vote.")
-                
-                self.db_manager.update_room(room_id, room)
+            # Already ready: nothing changed, so skip the write and the broadcast
+            if player_id in room['ready_to_vote']:
+                return
+            
+            room['ready_to_vote'].append(player_id)
+            player_name = get_player_name(room, player_id, "Someone")
+            add_lobby_event(room, f"{player_name} is ready to vote.")
+            
+            self.db_manager.update_room(room_id, room)
 
-        self.game_manager.emit_state_update(room_id)
-        
-        # Check if we need to transition - USE ACTIVE PLAYERS
-        from utils.helpers import get_active_players
-        room = self.db_manager.get_room(room_id)
-        if room:
-            active_players = get_active_players(room['players'])
-            ready_count = len(room.get('ready_to_vote', []))
+            # Decide on the transition from this same room read - USE ACTIVE PLAYERS
+            active_players = get_active_players(room["players"])
+            ready_count = len(room['ready_to_vote'])
             active_count = len(active_players)
             
-            print(f"🔍 READY CHECK - Ready: {ready_count}, Active: {active_count}, Active players: {[p['name'] for p in active_players]}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("🔍 READY CHECK - Ready: %s, Active: %s, Active players: %s",
+                             ready_count, active_count, [p['name'] for p in active_players])
             
             # Only transition from voting phase
-            if room['phase'] == 'voting' and ready_count == active_count:
-                self.game_manager.transition_to_vote_selection(room_id)
+            transition_needed = room['phase'] == 'voting' and ready_count == active_count
+
+        self.game_manager.emit_state_update(room_id, room)
+        
+        if transition_needed:
+            self.game_manager.transition_to_vote_selection(room_id)
     
     def handle_liar_vote(self, data):
         """Handle liar vote submission."""
@@ -261,7 +274,7 @@ class GameHandler:
         if not room_id or not voter_id or not target_id:
             return
 
-        with self.game_manager.lock:
+        with self.game_manager.room_lock(room_id):
             room = self.db_manager.get_room(room_id)
             if not room or room['phase'] != 'vote_selection':
                 return
@@ -273,6 +286,10 @@ class GameHandler:
             game_mode = room.get("settings", {}).get("gameMode", "normal")
 
             if game_mode != "mayhem":
+                # Normal mode: a voter is in at most one list, so re-voting the same target changes nothing
+                if voter_id in room['liarVotes'].get(target_id, ()):
+                    return
+                
                 # Normal mode: Remove previous vote (only one vote allowed)
                 for voters in room['liarVotes'].values():
                     if voter_id in voters:
@@ -285,9 +302,9 @@ class GameHandler:
             # Add the vote (even if duplicate in mayhem mode)
             room['liarVotes'][target_id].append(voter_id)
 
-            voter_name = next((p["name"] for p in room["players"] if p["id"] == voter_id), "Someone")
-            target_name = next((p["name"] for p in room["players"] if p["id"] == target_id), "Unknown")
-            room["lobby_events"].append(f"{voter_name} voted for {target_name}.")
+            voter_name = get_player_name(room, voter_id, "Someone")
+            target_name = get_player_name(room, target_id, "Unknown")
+            add_lobby_event(room, f"{voter_name} voted for {target_name}.")
             
             # Update room in database
             self.db_manager.update_room(room_id, room)
@@ -297,11 +314,11 @@ class GameHandler:
     def handle_voting_timer_expired(self, data):
         """Handle voting phase timer expiration."""
         room_id = data['roomId']
-        print(f"🟡 Event received: voting_timer_expired for room {room_id}")
+        logger.debug("🟡 Event received: voting_timer_expired for room %s", room_id)
 
         if self.db_manager.room_exists(room_id):
-            print(f"✅ Timer expired in voting phase — transitioning room {room_id}")
-            with self.game_manager.lock:
+            logger.info("✅ Timer expired in voting phase — transitioning room %s", room_id)
+            with self.game_manager.room_lock(room_id):
                 room = self.db_manager.get_room(room_id)
                 if room:
                     room['phase'] = 'vote_selection'
@@ -315,13 +332,13 @@ class GameHandler:
         room_id = data.get("roomId")
         new_settings = data.get("settings")
 
-        with self.game_manager.lock:
+        with self.game_manager.room_lock(room_id):
             room = self.db_manager.get_room(room_id)
             if not room:
                 return
 
             room["settings"] = new_settings
-            room["lobby_events"].append("Host updated the game settings.")
+            add_lobby_event(room, "Host updated the game settings.")
             
             # Update room in database
             self.db_manager.update_room(room_id, room)
@@ -336,7 +353,7 @@ class GameHandler:
         if not room_id or not player_id:
             return
         
-        print(f"Round transition request from player {player_id} in room {room_id}")
+        logger.debug("Round transition request from player %s in room %s", player_id, room_id)
         self.game_manager.handle_round_transition(room_id)
 
     def handle_new_game(self, data):
@@ -344,9 +361,9 @@ class GameHandler:
         room_id = data.get("roomId")
         player_id = data.get("playerId")
         
-        print(f"🔄 NEW GAME request from player {player_id} in room {room_id}")
+        logger.info("🔄 NEW GAME request from player %s in room %s", player_id, room_id)
         
-        with self.game_manager.lock:
+        with self.game_manager.room_lock(room_id):
             room = self.db_manager.get_room(room_id)
             if not room:
                 emit('error_event', {'message': 'Room not found.'}, room=request.sid)
@@ -357,10 +374,9 @@ class GameHandler:
                 emit('error_event', {'message': 'Only the host can start a new game.'}, room=request.sid)
                 return
             
-            print(f"✅ Host verified, resetting room {room_id}")
+            logger.debug("✅ Host verified, resetting room %s", room_id)
             
             # Get active players (preserve disconnected players in case they reconnect)
-            from utils.helpers import get_active_players
             active_players = get_active_players(room["players"])
             
             if len(active_players) < 2:
@@ -398,24 +414,22 @@ class GameHandler:
                 "gameMode": "normal"
             }
             
-            # Clear timestamps
-            room.pop("questionPhaseStartTimestamp", None)
-            room.pop("questionPhaseEndTimestamp", None)
-            room.pop("votingPhaseStartTimestamp", None)
-            room.pop("votingPhaseEndTimestamp", None)
-            room.pop("voteSelectionStartTimestamp", None)
-            room.pop("voteSelectionEndTimestamp", None)
+            # Clear timestamps (kept as None so the room stays complete)
+            for timestamp_key in ("questionPhaseStartTimestamp", "questionPhaseEndTimestamp",
+                                  "votingPhaseStartTimestamp", "votingPhaseEndTimestamp",
+                                  "voteSelectionStartTimestamp", "voteSelectionEndTimestamp"):
+                room[timestamp_key] = None
             
             # Add lobby event
-            room["lobby_events"].append("Host started a new game. Welcome back to the lobby!")
+            add_lobby_event(room, "Host started a new game. Welcome back to the lobby!")
             
             # Update room in database
             self.db_manager.update_room(room_id, room)
             
-            print(f"✅ Room {room_id} reset complete with {current_player_count} player slots")
+            logger.info("✅ Room %s reset complete with %s player slots", room_id, current_player_count)
         
         # Emit the new game state to all players
         room_state = self.game_manager.get_room_state(room_id)
         self.socketio.emit('new_game_started', {'gameState': room_state}, room=room_id)
         
-        print(f"✅ new_game_started event emitted to room {room_id}")
\ No newline at end of file
+        logger.debug("✅ new_game_started event emitted to room %s", room_id)
\ No newline at end of file
@@ -2,11 +2,14 @@
 Socket event handlers for room management operations.
 """
 
+import logging
 import uuid
 import time
 from flask import request
 from flask_socketio import emit, join_room, leave_room
-from utils.helpers import validate_room_data, sanitize_string, is_name_available, get_active_players
+from utils.helpers import validate_room_data, sanitize_string, is_name_available, get_active_players, add_lobby_event
+
+logger = logging.getLogger(__name__)
 
 
 class RoomHandler:
@@ -23,15 +26,15 @@ class RoomHandler:
         name = sanitize_string(data.get("name"))
         user_avatar = data.get("avatar")
         language = data.get("language", "en")
-        print(f"   Language received from frontend: {language}")  # ADD THIS
+        logger.debug("   Language received from frontend: %s", language)
         
-        print(f"Create room request: {request.sid} for room {room_id} with name {name} and avatar {user_avatar}")
+        logger.info("Create room request: %s for room %s with name %s and avatar %s", request.sid, room_id, name, user_avatar)
 
         if not room_id or not name or not user_avatar:
             emit('error_event', {'message': 'Room ID, name, and user avatar are required.'}, room=request.sid)
             return
 
-        with self.game_manager.lock:
+        with self.game_manager.room_lock(room_id):
             if self.db_manager.room_exists(room_id):
                 emit('error_event', {'message': 'Room already exists.'}, room=request.sid)
                 return
@@ -58,9 +61,10 @@ class RoomHandler:
             
             # Create room in database
             self.db_manager.create_room(room_id, room_data)
+            self.game_manager.seat_player(request.sid, room_id, player_id)
 
             join_room(room_id)
-            print(f"   About to emit join_confirmation with language: {language}")
+            logger.debug("   About to emit join_confirmation with language: %s", language)
             emit('join_confirmation', {'playerId': player_id, 'roomId': room_id, 'language': language}, room=request.sid)
 
         self.game_manager.emit_state_update(room_id)
@@ -71,13 +75,13 @@ class RoomHandler:
         name = sanitize_string(data.get("name"))
         user_avatar = data.get("avatar")
         
-        print(f"Join request: {request.sid} for room {room_id} with name {name} and avatar {user_avatar}")
+        logger.info("Join request: %s for room %s with name %s and avatar %s", request.sid, room_id, name, user_avatar)
         
         if not room_id or not name or not user_avatar:
             emit('error_event', {'message': 'Room ID, name, and user avatar are required.'}, room=request.sid)
             return
 
-        with self.game_manager.lock:
+        with self.game_manager.room_lock(room_id):
             room = self.db_manager.get_room(room_id)
             if not room:
                 # Get default language if room doesn't exist
@@ -100,30 +104,31 @@ class RoomHandler:
                 emit('error_event', {'message': self.get_error_message('game_in_progress', room_language)}, room=request.sid)
                 return
                 
-            from utils.helpers import get_active_players
-
             max_players = room.get("settings", {}).get("playerCount", 6)
             active_players = get_active_players(room["players"])
             current_player_count = len(active_players)
 
-            print(f"🔍 JOIN CHECK - Room {room_id}: {current_player_count} active players (out of {len(room['players'])} total), max {max_players}")
-            print(f"   Active players: {[p['name'] for p in active_players]}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("🔍 JOIN CHECK - Room %s: %s active players (out of %s total), max %s",
+                             room_id, current_player_count, len(room['players']), max_players)
+                logger.debug("   Active players: %s", [p['name'] for p in active_players])
 
             if current_player_count >= max_players:
-                print(f"❌ Room full! {current_player_count} >= {max_players}")
+                logger.info("❌ Room full! %s >= %s", current_player_count, max_players)
                 emit('error_event', {'message': self.get_error_message('room_full', room_language)}, room=request.sid)
                 return
 
-            if not is_name_available(room["players"], name):
+            if not is_name_available(room, name):
                 emit('error_event', {'message': self.get_error_message('name_taken', room_language)}, room=request.sid)
                 return
 
             # ALL VALIDATION PASSED - Now add the player
             player_id = str(uuid.uuid4())
             room["players"].append({"id": player_id, "name": name, "avatar": user_avatar, "socket_id": request.sid})
-            room["lobby_events"].append(f"{name} has joined the game.")
+            add_lobby_event(room, f"{name} has joined the game.")
             
             self.db_manager.update_room(room_id, room)
+            self.game_manager.seat_player(request.sid, room_id, player_id)
             join_room(room_id)
             
             emit('join_confirmation', {'playerId': player_id, 'roomId': room_id, 'language': room_language}, room=request.sid)
@@ -135,19 +140,20 @@ class RoomHandler:
         room_id = data.get("roomId")
         player_id = data.get("playerId")
         
-        print(f"Leave request: {request.sid} for room {room_id} with player ID {player_id}")
+        logger.info("Leave request: %s for room %s with player ID %s", request.sid, room_id, player_id)
         
         if not room_id or not player_id:
             emit('error_event', {'message': 'Room ID and player ID are required.'}, room=request.sid)
             return
 
-        with self.game_manager.lock:
+        with self.game_manager.room_lock(room_id):
             room = self.db_manager.get_room(room_id)
             if not room:
                 emit('error_event', {'message': 'The room you were trying to reach doesn\'t exist anymore.'}, room=request.sid)
                 return
             
-            print(f"🔍 BEFORE LEAVE - Players: {[p['name'] for p in room['players']]}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("🔍 BEFORE LEAVE - Players: %s", [p['name'] for p in room['players']])
             
             # Find the player in the room
             player_to_remove = next((p for p in room["players"] if p["id"] == player_id), None)
@@ -164,35 +170,39 @@ class RoomHandler:
             
             # Remove the player from the room
             room["players"] = [p for p in room["players"] if p["id"] != player_id]
-            room["lobby_events"].append(f"{player_name} has left the game.")
+            add_lobby_event(room, f"{player_name} has left the game.")
             
-            print(f"🔍 AFTER LEAVE - Players: {[p['name'] for p in room['players']]}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("🔍 AFTER LEAVE - Players: %s", [p['name'] for p in room['players']])
             
             # Leave the socket room
             leave_room(room_id)
+            self.game_manager.unseat_player(request.sid, room_id)
             
             # Send confirmation to the leaving player
             emit('leave_confirmation', {'message': 'Successfully left the room.'}, room=request.sid)
             
             # Check if room is now empty
             if not room["players"]:
-                self.db_manager.delete_room(room_id)
-                print(f"Room {room_id} is empty and has been removed.")
+                self.game_manager.delete_room(room_id)
+                logger.info("Room %s is empty and has been removed.", room_id)
                 return
             
             # If the host left, assign a new host
             if player_id == room["host_id"]:
                 room["host_id"] = room["players"][0]["id"]
                 new_host_name = room["players"][0]["name"]
-                room["lobby_events"].append(f"{new_host_name} is the new host.")
+                add_lobby_event(room, f"{new_host_name} is the new host.")
         
             # Update room in database
-            print(f"🔍 UPDATING DATABASE - Players before update: {[p['name'] for p in room['players']]}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("🔍 UPDATING DATABASE - Players before update: %s", [p['name'] for p in room['players']])
             self.db_manager.update_room(room_id, room)
             
             # Verify the update worked
-            verify_room = self.db_manager.get_room(room_id)
-            print(f"🔍 VERIFY DATABASE - Players after update: {[p['name'] for p in verify_room['players']]}")
+            if logger.isEnabledFor(logging.DEBUG):
+                verify_room = self.db_manager.get_room(room_id)
+                logger.debug("🔍 VERIFY DATABASE - Players after update: %s", [p['name'] for p in verify_room['players']])
         
         # Update all remaining players in the room
         self.game_manager.emit_state_update(room_id)
@@ -203,9 +213,9 @@ class RoomHandler:
         target_player_id = data.get("targetPlayerId")
         by_player_id = data.get("byPlayerId")
 
-        print(f"KICK request: {by_player_id} is trying to kick {target_player_id} from {room_id}")
+        logger.info("KICK request: %s is trying to kick %s from %s", by_player_id, target_player_id, room_id)
 
-        with self.game_manager.lock:
+        with self.game_manager.room_lock(room_id):
             room = self.db_manager.get_room(room_id)
             if not room:
                 emit("error_event", {"message": "Room not found."}, room=request.sid)
@@ -228,14 +238,15 @@ class RoomHandler:
             
             # 1. Remove player from Socket.IO room FIRST
             leave_room(room_id, sid=target_socket_id)
+            self.game_manager.unseat_player(target_socket_id, room_id)
             
             # 2. Update database
             room["players"] = [p for p in room["players"] if p["id"] != target_player_id]
-            room["lobby_events"].append(f"{player_name} was kicked from the game.")
+            add_lobby_event(room, f"{player_name} was kicked from the game.")
             self.db_manager.update_room(room_id, room)
 
         # 3. Send kick message (they're not in the room anymore, so won't get state update)
-        print(f"🚨 EMITTING kicked_from_room to socket {target_socket_id}")
+        logger.info("🚨 EMITTING kicked_from_room to socket %s", target_socket_id)
         emit('kicked_from_room', {"message": self.get_error_message('kicked', room_language)}, to=target_socket_id)
         
         # 4. Now emit state update (kicked player won't receive it)
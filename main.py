@@ -1,5 +1,14 @@
 # main.py - Main entry point for Kellak Lies Game
+import eventlet
+eventlet.monkey_patch()  # Must run before anything else imports socket/threading/time
+
 import os
+import socket
+import eventlet.wsgi
+import atexit
+import queue
+import logging
+import logging.handlers
 from flask import Flask
 from flask_socketio import SocketIO
 
@@ -9,10 +18,22 @@ from game.game_manager import GameManager
 from handlers.room_handler import RoomHandler
 from handlers.game_handler import GameHandler
 from handlers.connection_handler import ConnectionHandler
+from utils import socket_json
+
+# Log records are queued and written out by a listener, so handlers never block on stdout.
+# Set LOG_LEVEL=DEBUG for the per-emit and per-player detail.
+log_queue = queue.Queue()
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper(), format="%(message)s",
+                    handlers=[logging.handlers.QueueHandler(log_queue)])
+log_listener = logging.handlers.QueueListener(log_queue, logging.StreamHandler())
+log_listener.start()
+atexit.register(log_listener.stop)
 
 # Initialize Flask app and SocketIO
 app = Flask(__name__)
-socketio = SocketIO(app, cors_allowed_origins="*")
+# Served by eventlet's WSGI server so many sockets are handled concurrently on green threads;
+# packets are encoded with orjson (same JSON on the wire)
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode="eventlet", json=socket_json)
 
 # Initialize components
 db_manager = DatabaseManager()
@@ -120,6 +141,10 @@ if __name__ == "__main__":
     DEVELOPMENT = False
     if not DEVELOPMENT:
         port = int(os.environ.get("PORT", 5000))
-        socketio.run(app, host="0.0.0.0", port=port, allow_unsafe_werkzeug=True)
+        # Same eventlet server socketio.run would start, but with Nagle disabled on the
+        # listener; accepted sockets inherit TCP_NODELAY, so small game packets go out at once
+        listener = eventlet.listen(("0.0.0.0", port))
+        listener.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        eventlet.wsgi.server(listener, app, log_output=False)
     else:
-        socketio.run(app, port=5000, debug=True, allow_unsafe_werkzeug=True)  # debug=True for development
\ No newline at end of file
+        socketio.run(app, port=5000, debug=True)  # debug=True for development
\ No newline at end of file
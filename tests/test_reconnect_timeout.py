@@ -0,0 +1,116 @@
+"""
+Tests for the reconnect timeout in ConnectionHandler.schedule_reconnect_timeout.
+Run from the repository root with: python -m unittest discover tests
+"""
+
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from flask import Flask
+from flask_socketio import SocketIO
+
+import handlers.connection_handler as connection_handler
+from database.db_manager import DatabaseManager
+from game.game_manager import GameManager
+from handlers.connection_handler import ConnectionHandler
+
+# Short reconnect window so the timer fires quickly during tests
+TEST_TIMEOUT_SECONDS = 0.05
+
+
+class ReconnectTimeoutTest(unittest.TestCase):
+    """A player whose reconnect window runs out is removed along with everything they left behind."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_manager = DatabaseManager(os.path.join(self.tmpdir.name, 'test.db'))
+        self.socketio = SocketIO(Flask(__name__), async_mode="threading")
+        self.game_manager = GameManager(self.db_manager, self.socketio)
+        self.handler = ConnectionHandler(self.db_manager, self.game_manager, self.socketio)
+        patcher = mock.patch.object(connection_handler, 'RECONNECT_TIMEOUT_SECONDS', TEST_TIMEOUT_SECONDS)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.db_manager.cleanup_database()
+        self.tmpdir.cleanup()
+
+    def _create_room(self, room_id, phase, disconnected_ids, **fields):
+        """Create a room with players p1..p4; the given ones are disconnected."""
+        disconnect_time = time.time()
+        players = []
+        for player_id in ('p1', 'p2', 'p3', 'p4'):
+            player = {"id": player_id, "name": player_id.upper(), "avatar": "a"}
+            if player_id in disconnected_ids:
+                player["disconnected"] = True
+                player["disconnect_time"] = disconnect_time
+            else:
+                player["socket_id"] = f"sid-{player_id}"
+            players.append(player)
+        room = {"players": players, "host_id": "p1", "phase": phase, **fields}
+        self.db_manager.create_room(room_id, room)
+        return disconnect_time
+
+    def _expire(self, room_id, player_id, disconnect_time):
+        """Start the timer and wait until it has run."""
+        self.handler.schedule_reconnect_timeout(room_id, player_id, disconnect_time)
+        # Covers the timeout plus the removal and its state emit
+        time.sleep(TEST_TIMEOUT_SECONDS + 0.2)
+
+    def test_expired_player_data_is_dropped(self):
+        disconnect_time = self._create_room(
+            'R1', 'vote_selection', {'p4'},
+            answers={"p1": "a", "p2": "b", "p4": "d"},
+            votes={"p4": "p1"},
+            ready_to_vote=["p4"],
+            liarVotes={"p1": ["p4"], "p4": ["p2"]},
+        )
+
+        self._expire('R1', 'p4', disconnect_time)
+
+        room = self.db_manager.get_room('R1')
+        self.assertEqual([p["id"] for p in room["players"]], ['p1', 'p2', 'p3'])
+        self.assertNotIn('p4', room["answers"])
+        self.assertNotIn('p4', room["votes"])
+        self.assertNotIn('p4', room["ready_to_vote"])
+        self.assertEqual(room["liarVotes"], {"p1": []})
+        self.assertIn('reconnect timeout', room["lobby_events"][-1])
+
+    def test_phase_transition_runs_after_removal(self):
+        # Every active player has answered; only the stale answer of p4 keeps the counts apart
+        disconnect_time = self._create_room(
+            'R2', 'question', {'p4'},
+            answers={"p1": "a", "p2": "b", "p3": "c", "p4": "d"},
+        )
+
+        self._expire('R2', 'p4', disconnect_time)
+
+        room = self.db_manager.get_room('R2')
+        self.assertEqual(room["phase"], 'voting')
+        self.assertIsNotNone(room["votingPhaseStartTimestamp"])
+        self.assertNotIn('p4', room["answers"])
+
+    def test_room_without_active_players_is_deleted(self):
+        disconnect_time = self._create_room('R3', 'voting', {'p1', 'p2', 'p3', 'p4'})
+
+        self._expire('R3', 'p4', disconnect_time)
+
+        self.assertIsNone(self.db_manager.get_room('R3'))
+
+    def test_rejoined_player_is_kept(self):
+        disconnect_time = self._create_room('R4', 'voting', {'p4'}, answers={"p4": "d"})
+        room = self.db_manager.get_room('R4')
+        room["players"][3]["disconnected"] = False
+
+        self._expire('R4', 'p4', disconnect_time)
+
+        room = self.db_manager.get_room('R4')
+        self.assertEqual(len(room["players"]), 4)
+        self.assertIn('p4', room["answers"])
+
+
+if __name__ == '__main__':
+    unittest.main()
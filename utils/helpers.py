@@ -3,8 +3,35 @@ Utility functions for the Dai Maou Liar Game.
 Contains question handling, validation, and other helper functions.
 """
 
+import logging
 import pandas as pd
 import random
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+
+# Lobby events kept per room; older ones are dropped so state payloads stay bounded
+MAX_LOBBY_EVENTS = 50
+
+
+@lru_cache(maxsize=None)
+def load_question_pairs(csv_file):
+    """
+    Loads a question CSV once and caches it as a tuple of (normal, imposter) pairs.
+    
+    Args:
+        csv_file (str): Path to the question pairs CSV
+    
+    Returns:
+        tuple: Tuple of (normal_question, imposter_question) tuples
+    """
+    logger.info("🔍 Loading CSV file: %s", csv_file)
+    df = pd.read_csv(csv_file)
+    if df.empty:
+        raise ValueError(f"{csv_file} is empty.")
+    
+    return tuple(df[['Normal_Question', 'Imposter_Question']].itertuples(index=False, name=None))
 
 
 def get_question_pair(used_indexes=None, language='en'):
@@ -12,38 +39,35 @@ def get_question_pair(used_indexes=None, language='en'):
     if used_indexes is None:
         used_indexes = []
     
-    print(f"🔍 get_question_pair called with language: {language}")
-    print(f"🔍 used_indexes received: {used_indexes}")
+    logger.debug("🔍 get_question_pair called with language: %s", language)
+    logger.debug("🔍 used_indexes received: %s", used_indexes)
     
     try:
         # Select CSV file based on language
         csv_file = 'question_pairs_ar.csv' if language == 'ar' else 'question_pairs.csv'
-        print(f"🔍 Loading CSV file: {csv_file}")
+        question_pairs = load_question_pairs(csv_file)
         
-        df = pd.read_csv(csv_file)
-        if df.empty:
-            raise ValueError(f"{csv_file} is empty.")
+        all_indexes = range(len(question_pairs))
+        # The room stores a JSON list; test membership against a set instead
+        used = set(used_indexes)
+        available_indexes = [i for i in all_indexes if i not in used]
         
-        all_indexes = list(range(len(df)))
-        available_indexes = [i for i in all_indexes if i not in used_indexes]
-        
-        print(f"🔍 Total questions in CSV: {len(all_indexes)}")
-        print(f"🔍 Available indexes after filtering: {available_indexes}")
+        logger.debug("🔍 Total questions in CSV: %s", len(all_indexes))
+        logger.debug("🔍 Available indexes after filtering: %s", available_indexes)
         
         if not available_indexes:
-            print("⚠️ WARNING: All questions used. Resetting pool.")
+            logger.warning("⚠️ WARNING: All questions used. Resetting pool.")
             available_indexes = all_indexes
         
         selected_index = random.choice(available_indexes)
-        row = df.iloc[selected_index]
-        question_pair = (row['Normal_Question'], row['Imposter_Question'])
+        question_pair = question_pairs[selected_index]
         
-        print(f"✅ Selected question index {selected_index}: {question_pair[0][:50]}...")
+        logger.info("✅ Selected question index %s: %.50s...", selected_index, question_pair[0])
         
         return (question_pair[0], question_pair[1], selected_index)
         
     except Exception as e:
-        print(f"❌ ERROR: Could not load {csv_file} ({e}). Using default pairs.")
+        logger.error("❌ ERROR: Could not load %s (%s). Using default pairs.", csv_file, e)
         return None
         
 def validate_room_data(data, required_fields):
@@ -82,18 +106,18 @@ def sanitize_string(input_string, max_length=100):
     return sanitized
 
 
-def is_name_available(players_list, name):
+def is_name_available(room, name):
     """
-    Checks if a name is available in a list of players.
+    Checks if a name is available in a room, via the cached name index.
     
     Args:
-        players_list (list): List of player dictionaries
+        room (dict): The room dictionary
         name (str): The name to check
     
     Returns:
         bool: True if name is available, False otherwise
     """
-    return not any(p["name"] == name for p in players_list)
+    return name not in get_players_by_name(room)
 
 
 def get_active_players(players_list):
@@ -107,3 +131,71 @@ def get_active_players(players_list):
         list: List of active players
     """
     return [p for p in players_list if not p.get("disconnected")]
+
+
+def add_lobby_event(room, *messages):
+    """
+    Appends messages to a room's lobby events, keeping only the most recent MAX_LOBBY_EVENTS.
+    
+    Args:
+        room (dict): The room dictionary
+        *messages (str): Event messages to append, in order
+    """
+    events = room["lobby_events"]
+    events.extend(messages)
+    if len(events) > MAX_LOBBY_EVENTS:
+        del events[:-MAX_LOBBY_EVENTS]
+
+
+def get_players_by_id(room):
+    """
+    Returns a {player_id: player} index of a room's players.
+    The index is cached on the room and rebuilt whenever the players list
+    is replaced or appended to, so repeated lookups skip the list scan.
+    
+    Args:
+        room (dict): The room dictionary
+    
+    Returns:
+        dict: Mapping of player ID to player dictionary
+    """
+    return _cached_player_index(room, "_players_by_id", "id")
+
+
+def get_players_by_name(room):
+    """
+    Returns a {name: player} index of a room's players, cached like get_players_by_id.
+    
+    Args:
+        room (dict): The room dictionary
+    
+    Returns:
+        dict: Mapping of player name to player dictionary
+    """
+    return _cached_player_index(room, "_players_by_name", "name")
+
+
+def _cached_player_index(room, cache_key, field):
+    """Build (or reuse) the room's players index keyed on one player field."""
+    players = room["players"]
+    cached = room.get(cache_key)
+    if cached is None or cached[0] is not players or len(cached[1]) != len(players):
+        cached = (players, {p[field]: p for p in players})
+        room[cache_key] = cached
+    return cached[1]
+
+
+def get_player_name(room, player_id, default="Unknown"):
+    """
+    Looks up a player's display name by ID.
+    
+    Args:
+        room (dict): The room dictionary
+        player_id (str): The player ID to look up
+        default (str): Name returned when the player isn't in the room
+    
+    Returns:
+        str: The player's name, or the default
+    """
+    player = get_players_by_id(room).get(player_id)
+    return player["name"] if player else default
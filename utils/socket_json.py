@@ -0,0 +1,35 @@
+"""
+orjson-backed JSON module for Socket.IO packet encoding.
+Passed to SocketIO(json=...); the wire format stays plain JSON, so clients need no changes.
+"""
+
+import orjson
+
+
+def dumps(obj, **kwargs):
+    """
+    Serialize a packet payload to a JSON string.
+
+    Args:
+        obj: Payload to encode
+        **kwargs: Stdlib json options (e.g. separators); orjson output is already compact
+
+    Returns:
+        str: Encoded JSON
+    """
+    # Stdlib json turns int keys into strings; keep that behaviour
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
+def loads(s, **kwargs):
+    """
+    Parse a JSON packet payload.
+
+    Args:
+        s: JSON text (str or bytes)
+        **kwargs: Stdlib json options, ignored
+
+    Returns:
+        Decoded payload
+    """
+    return orjson.loads(s)